@@ -1,8 +1,12 @@
 import logging
-from datetime import datetime, timezone
+import math
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from decimal import Decimal
 from zoneinfo import ZoneInfo
 
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 from botocore.exceptions import ClientError
 
 from ..models.Device import (
@@ -13,6 +17,8 @@ from ..models.Device import (
     ScheduleData,
 )
 from ..models.SerialNumber import Serial_Number, DeviceSetup
+from ..internal.cache import TTLCache
+from .NotificationHub import NotificationHub
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -24,11 +30,52 @@ logging.basicConfig(
 
 
 class DeviceDataManager:
-    def __init__(self, dyn_resource):
+    # Attempts made to complete a batch request with unprocessed items
+    MAX_BATCH_ATTEMPTS = 3
+    # Delay (in seconds) before retrying unprocessed items, doubled on each attempt
+    BATCH_RETRY_DELAY = 0.05
+    # Maximum number of items written by a single BatchWriteItem call
+    BATCH_WRITE_SIZE = 25
+    # Attribute holding when schedules end (in seconds since the epoch), to be set
+    # as the TTL attribute of the Schedule and Schedule Control Tables
+    SCHEDULE_TTL_ATTRIBUTE = "expires_at"
+    # Items read by each query looking for schedules that have not ended, going past
+    # the ended ones (kept until their TTL removes them)
+    SCHEDULE_QUERY_PAGE = 10
+    # Recurring schedules are stored in a partition of their own (the serial number
+    # with this suffix), the device's other schedules never overlapping each other
+    SCHEDULE_SERIES_SUFFIX = "#series"
+    # Each device's schedule version, bumped with every write of its schedules, is
+    # kept in the Schedule Control Table under the serial number with this suffix
+    SCHEDULE_VERSION_SUFFIX = "#version"
+
+    def __init__(
+        self,
+        dyn_resource,
+        notification_hub: NotificationHub | None = None,
+        history_cache: TTLCache[str, MasterData | None] | None = None,
+        serial_cache: TTLCache[str, bool] | None = None,
+        unregistered_serial_cache: TTLCache[str, bool | None] | None = None,
+    ):
         """
         : param dyn_resource: A Boto3 DynamoDB resource.
+        : param notification_hub: Hub notified when a device's control data or
+        state changes.
+        : param history_cache: Write-through cache of the Master History Table,
+        keyed by serial number (None values cache missing items).
+        : param serial_cache: Cache of active serial numbers, with a long TTL.
+        : param unregistered_serial_cache: Cache of the Active state of serial
+        numbers that are inactive (False) or not found (None), with a short TTL.
+        Kept apart from serial_cache, so that lookups of unknown serial numbers
+        cannot evict registered devices.
         """
         self.dyn_resource = dyn_resource
+        self.notification_hub = notification_hub or NotificationHub()
+        self.history_cache = history_cache or TTLCache(maxsize=4096, ttl=30.0)
+        self.serial_cache = serial_cache or TTLCache(maxsize=16384, ttl=3600.0)
+        self.unregistered_serial_cache = unregistered_serial_cache or TTLCache(
+            maxsize=4096, ttl=10.0
+        )
         # Table to register Serial Numbers
         self.serial_table = None
         # Table to store state history of devices
@@ -49,11 +96,18 @@ class DeviceDataManager:
         schedule_table: str,
         schedule_control_table: str,
         serial_number_table: str,
+        describe: bool = True,
     ) -> bool:
         """
         Attempts to load the given tables, storing them in a disctionary that is stored
         as a member variable. Returns a boolean indicating whether all tables were
         loaded or not.
+
+        If describe is False, the tables are bound without checking that they exist
+        (no DescribeTable round trip), and True is returned.
+
+        # Exceptions
+        Raises a ValueError if the existence of a table could not be checked.
         """
         table_names = (
             device_table,
@@ -66,31 +120,39 @@ class DeviceDataManager:
         table_existence = [False] * len(table_names)
         loading_tables = []
         for i, table_in in enumerate(table_names):
-            try:
-                table = self.dyn_resource.Table(table_in)
-                table.load()
-                table_existence[i] = True
-            except ClientError as err:
-                if err.response["Error"]["Code"] == "ResourceNotFoundException":
-                    table_existence[i] = False
-                else:
-                    logger.error(
-                        "Couldn't check for existence of tables. Here's why: %s: %s",
-                        err.response["Error"]["Code"],
-                        err.response["Error"]["Message"],
-                    )
-                    raise ValueError from err
-            else:
-                loading_tables.append(table)
+            table_existence[i] = not describe or self.table_exists(table_in)
+            if table_existence[i]:
+                loading_tables.append(self.dyn_resource.Table(table_in))
         try:
             self.device_table = loading_tables[0]
             self.master_order_table, self.master_history_table = loading_tables[1:3]
             self.schedule_table, self.schedule_control_table = loading_tables[3:5]
             self.serial_table = loading_tables[5]
-        except ValueError:
+        except (IndexError, ValueError):
             return False
         return all(table_existence)
 
+    def table_exists(self, table_name: str) -> bool:
+        """
+        Checks whether the given table exists (a DescribeTable round trip), without
+        binding it, see load_tables.
+
+        # Exceptions
+        Raises a ValueError if the existence of the table could not be checked.
+        """
+        try:
+            self.dyn_resource.Table(table_name).load()
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "ResourceNotFoundException":
+                return False
+            logger.error(
+                "Couldn't check for existence of tables. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise ValueError from err
+        return True
+
     ### Serial Number Registration ###
     # Not Central is it ..., How do you scale this ...
     # Serial Number Versioning, ... coupled at the moment ...
@@ -143,6 +205,8 @@ class DeviceDataManager:
             )
         except ClientError as err:
             raise RuntimeError("Client Error") from err
+        finally:
+            self._invalidate_serial(new_serial_number)
         return new_serial_number
 
     def activate_device_serial(self, serial: str) -> None:
@@ -177,6 +241,8 @@ class DeviceDataManager:
                 raise RuntimeError(
                     f"Unable to update entry, when attempting to activate {serial}!"
                 ) from err
+        finally:
+            self._invalidate_serial(serial)
         # Update Device Count
         try:
             self.serial_table.update_item(
@@ -221,6 +287,8 @@ class DeviceDataManager:
                 raise RuntimeError(
                     f"Unable to update entry, when attempting to deactivate {serial}!"
                 ) from err
+        finally:
+            self._invalidate_serial(serial)
         # Update Device Count
         try:
             self.serial_table.update_item(
@@ -241,6 +309,9 @@ class DeviceDataManager:
         Also takes an optional argument is_active, which if set to False
         will return True if the serial number is registered but inactive.
 
+        Results are cached, for a long time if the serial number is active and
+        briefly otherwise (so unknown serial numbers cannot flood the table).
+        Changes made through this manager invalidate the cache immediately.
 
         # Exceptions
         Raises a RuntimeError if there is an issue with the database.
@@ -248,14 +319,28 @@ class DeviceDataManager:
         assert (
             self.serial_table is not None
         ), "Serial Table not loaded, call load_tables()"
-        try:
-            response = self.serial_table.get_item(Key={"Serial_Number": serial})
-        except ClientError as err:
-            raise RuntimeError("Error with AWS DynamoDB") from err
-        else:
-            if "Item" in response:
-                return response.get("Item").get("Active") == is_active
-            return False
+        found, active = self.serial_cache.lookup(serial)
+        if not found:
+            found, active = self.unregistered_serial_cache.lookup(serial)
+        if not found:
+            try:
+                response = self.serial_table.get_item(Key={"Serial_Number": serial})
+            except ClientError as err:
+                raise RuntimeError("Error with AWS DynamoDB") from err
+            active = response["Item"].get("Active") if "Item" in response else None
+            if active is True:
+                self.serial_cache.set(serial, active)
+            else:
+                self.unregistered_serial_cache.set(serial, active)
+        return active is not None and active == is_active
+
+    def _invalidate_serial(self, serial: str) -> None:
+        """
+        [For internal use only] Removes a serial number from the registration
+        caches, must be called whenever its entry in the Serial Table changes.
+        """
+        self.serial_cache.invalidate(serial)
+        self.unregistered_serial_cache.invalidate(serial)
 
     def _register_testing_device(self, serial_code: str) -> Serial_Number:
         """
@@ -269,8 +354,8 @@ class DeviceDataManager:
             raise RuntimeError("User_Table not loaded!")
         elif serial_code == "00000000":
             raise ValueError(f"Serial Number: {serial_code} is reserved for testing")
+        serial_number = "TEST" + str(serial_code)
         try:
-            serial_number = "TEST" + str(serial_code)
             self.serial_table.put_item(
                 Item={"Serial_Number": serial_number, "Active": True},
                 ConditionExpression="attribute_not_exists(Serial_Number)",
@@ -279,6 +364,8 @@ class DeviceDataManager:
             if err.response["Error"]["Code"] == "ConditionalCheckFailedException":
                 raise ValueError("Serial Number already exists") from err
             raise ValueError("Error registering device") from err
+        finally:
+            self._invalidate_serial(serial_number)
         return serial_number
 
     def _deregister_testing_device(self, serial_code: str) -> Serial_Number:
@@ -294,6 +381,8 @@ class DeviceDataManager:
             self.serial_table.delete_item(Key={"Serial_Number": "TEST" + serial_code})
         except ClientError as err:
             raise ValueError("Serial Number not found") from err
+        finally:
+            self._invalidate_serial("TEST" + serial_code)
         # TODO: Check all tables
         return "TEST" + serial_code
 
@@ -315,26 +404,86 @@ class DeviceDataManager:
         except ClientError as err:
             raise RuntimeError("Issue encountered with AWS DynamoDB") from err
 
+    def put_device_data_batch(self, data: list[DeviceData]) -> list[bool]:
+        """
+        Puts items into the device history table, with one BatchWriteItem call per
+        BATCH_WRITE_SIZE items and retrying unprocessed items. Returns whether each
+        item was written, in the given order. Items with the same key (serial number
+        and time) are written once, with the last of their values.
+
+        # Exceptions
+        Raises a RuntimeError if the Device Table is not loaded.
+        """
+        if self.device_table is None:
+            raise RuntimeError("Device Table not loaded, call load_tables()")
+        items = self._unique_device_items(data)
+        keys = list(items)
+        written: set[tuple[str, str]] = set()
+        for start in range(0, len(keys), self.BATCH_WRITE_SIZE):
+            chunk = keys[start : start + self.BATCH_WRITE_SIZE]
+            written |= self._batch_write_device_items([items[key] for key in chunk])
+        return [(dt.Serial_Number, dt.Local_Time_Str) in written for dt in data]
+
     def get_device_data(self, serial: str) -> list[DeviceData] | None:
         """
-        Gets an item from the Device Data Table
+        Gets all items of a device from the Device Data Table (oldest first), going
+        through every page of the query. See query_device_data to page through
+        long histories instead.
 
         # Exceptions
-        Raises a ValueError if the item is not found.
+        Raises a ValueError if there is an issue with AWS.
         """
+        items: list[DeviceData] = []
+        start_key = None
+        try:
+            while True:
+                page, start_key = self.query_device_data(
+                    serial, limit=None, newest_first=False, start_key=start_key
+                )
+                items += page
+                if start_key is None:
+                    break
+        except RuntimeError as err:
+            raise ValueError("Issue encountered with AWS") from err
+        return items or None
+
+    def query_device_data(
+        self,
+        serial: str,
+        start: str | None = None,
+        end: str | None = None,
+        limit: int | None = 100,
+        newest_first: bool = True,
+        start_key: dict | None = None,
+    ) -> tuple[list[DeviceData], dict | None]:
+        """
+        Gets a page of at most limit items of a device from the Device Data Table,
+        with Local_Time_Str between start and end (inclusive, if given). Returns the
+        items and the key to pass as start_key to get the next page, None if this
+        was the last page. A page may hold fewer than limit items (DynamoDB returns
+        at most 1 MB per call).
+
+        # Exceptions
+        Raises a RuntimeError if there is an issue with AWS DynamoDB.
+        """
+        assert (
+            self.device_table is not None
+        ), "Device Table not loaded, call load_tables()"
         try:
-            assert (
-                self.device_table is not None
-            ), "Device Table not loaded, call load_tables()"
             response = self.device_table.query(
-                KeyConditionExpression=(Key("Serial_Number").eq(serial))
+                **self._device_query_kwargs(
+                    serial, start, end, limit, newest_first, start_key
+                )
             )
         except ClientError as err:
-            raise ValueError("Issue encountered with AWS") from err
-        else:
-            if response.get("Items"):
-                return [DeviceData(**dt) for dt in response.get("Items")]
-            return None
+            logger.error(
+                "Couldn't query device data. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise RuntimeError("Issue encountered with AWS DynamoDB") from err
+        items = [DeviceData(**dt) for dt in response.get("Items", [])]
+        return items, response.get("LastEvaluatedKey")
 
     def _remove_device_history(self, serial: str) -> None:
         """
@@ -367,6 +516,11 @@ class DeviceDataManager:
         table can be either History or Order, anything else will be rejected.
         If no order found, return None.
 
+        History items are served from the history cache when possible. Every write
+        to the Master History Table made through this manager updates the cache,
+        so it only goes stale on writes made by other processes (for at most the
+        cache's TTL).
+
         # Exceptions
         Raises a Syntax Error if the table_class is not "Order" or "History".
         Throws a Runtime Error if the Master Tables are not loaded or if
@@ -378,6 +532,9 @@ class DeviceDataManager:
             table = self.master_order_table
         elif table_class == "History":
             table = self.master_history_table
+            found, cached = self.history_cache.lookup(serial)
+            if found:
+                return cached
         else:
             raise SyntaxError("Table must be either 'Order' or 'History'")
 
@@ -392,9 +549,10 @@ class DeviceDataManager:
             raise RuntimeError(
                 "AWS DynamoDB is being uncooperative right now."
             ) from err
-        if "Item" in response:
-            return MasterData(**response.get("Item"))
-        return None
+        data = MasterData(**response["Item"]) if "Item" in response else None
+        if table_class == "History":
+            self.history_cache.set(serial, data)
+        return data
 
     def put_master_order(self, serial: str, data: MasterData) -> None:
         """
@@ -412,8 +570,11 @@ class DeviceDataManager:
             self.master_order_table.put_item(Item=entry)
         except ClientError as err:
             raise RuntimeError("Issue encountered with AWS DynamoDB") from err
+        self.notification_hub.publish(
+            serial, NotificationHub.CONTROL, NotificationHub.HISTORY
+        )
 
-    def serve_order(self, serial: str, order_data: MasterData) -> None:
+    def serve_order(self, serial: str, order_data: MasterData) -> bool:
         """
         Takes an order from the Master Order Table and moves it to the
         Master History Table. Removes it from the Master Order Table.
@@ -421,14 +582,38 @@ class DeviceDataManager:
         (i.e. after device calls get_master_data with "Order" table
         and if order exists for that device).
 
+        The move is a single transaction, conditional on the order still being in
+        the Master Order Table (unchanged), so an order can only be served once.
+        Returns True if the order was served, and False if it was already served
+        (or replaced) by a concurrent request.
+
         # Exceptions
 
         Raises a ValueError if unsuccessful, when there is an issue with the AWS,
         i.e. unable to either move the message to the history table or
         remove it from the order table.
         """
-        self._put_master_history(serial, order_data)
-        self._remove_master_order(serial)
+        try:
+            self._transact_write_items(
+                self._serve_order_transact_items(serial, order_data)
+            )
+        except ClientError as err:
+            # History may have been written by whoever served the order (or by the
+            # failed transaction), reread it next time
+            self.history_cache.invalidate(serial)
+            if self._is_condition_cancellation(err):
+                return False
+            logger.error(
+                "Couldn't serve order. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise ValueError(
+                "Unable to serve order. Issue encountered with AWS DynamoDB"
+            ) from err
+        self.history_cache.set(serial, order_data)
+        self.notification_hub.publish(serial, NotificationHub.HISTORY)
+        return True
 
     def _put_master_history(self, serial: str, data: MasterData) -> None:
         """
@@ -445,6 +630,7 @@ class DeviceDataManager:
             entry["Serial_Number"] = serial
             self.master_history_table.put_item(Item=entry)
         except ClientError as err:
+            self.history_cache.invalidate(serial)
             logger.error(
                 "Couldn't put item in history table. Here's why: %s: %s",
                 err.response["Error"]["Code"],
@@ -454,6 +640,8 @@ class DeviceDataManager:
                 f"Unable to store item in {self.master_history_table}. "
                 + "Issue encountered with AWS DynamoDB"
             ) from err
+        self.history_cache.set(serial, data)
+        self.notification_hub.publish(serial, NotificationHub.HISTORY)
 
     def _remove_master_order(self, serial: str) -> None:
         """
@@ -475,6 +663,287 @@ class DeviceDataManager:
             )
             raise RuntimeError("AWS is being a lil' b*tch right now") from err
 
+    def fetch_control_bundle(
+        self, serial: str, refresh: bool = False
+    ) -> tuple[MasterData | None, ScheduleData | None]:
+        """
+        Fetches and consumes the pending control data for a device. The master order
+        and the schedule control are read in a single BatchGetItem, and the order is
+        then moved to the Master History Table (and the served schedule removed from
+        the Schedule Control Table) in a single TransactWriteItems call.
+
+        If refresh is True, the earliest future schedule is taken from the Schedule
+        Table (see _refresh_schedules) and served directly, instead of being put in
+        the Schedule Control Table only to be read and removed again.
+
+        Returns a tuple of the served master order and schedule, either may be None.
+
+        # Exceptions
+        Raises a RuntimeError if the tables are not loaded or if there is an issue
+        with AWS.
+        """
+        if self.master_order_table is None or self.master_history_table is None:
+            raise RuntimeError("Master Tables not loaded!")
+        if self.schedule_control_table is None:
+            raise RuntimeError("Schedule Control Table not loaded!")
+
+        key = {"Serial_Number": serial}
+        tables = [self.master_order_table]
+        if refresh:
+            try:
+                schedule_item = self._refresh_schedules(serial)
+            except ValueError as err:
+                raise RuntimeError("Unable to refresh schedules") from err
+        else:
+            tables.append(self.schedule_control_table)
+
+        try:
+            items = self._batch_get_items(tables, key)
+        except ClientError as err:
+            logger.error(
+                "Couldn't batch get control data. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise RuntimeError(
+                "AWS DynamoDB is being uncooperative right now."
+            ) from err
+
+        order_item = items.get(self.master_order_table.name)
+        if not refresh:
+            schedule_item = items.get(self.schedule_control_table.name)
+
+        master_order = MasterData(**order_item) if order_item is not None else None
+        schedule_order = None
+        if schedule_item is not None:
+            try:
+                schedule_order = ScheduleData(**schedule_item)
+            except ValueError:
+                # Stale (already ended) schedule left in the control table
+                schedule_order = None
+
+        control_items = []
+        if refresh or schedule_item is not None:
+            control_items.append(
+                {"Delete": {"TableName": self.schedule_control_table.name, "Key": key}}
+            )
+
+        try:
+            if master_order is not None:
+                try:
+                    self._transact_write_items(
+                        self._serve_order_transact_items(serial, master_order)
+                        + control_items
+                    )
+                    control_items = []
+                except ClientError as err:
+                    self.history_cache.invalidate(serial)
+                    if not self._is_condition_cancellation(err):
+                        raise
+                    # Order already served by a concurrent poll, don't serve it again
+                    master_order = None
+            if control_items:
+                self._transact_write_items(control_items)
+        except ClientError as err:
+            logger.error(
+                "Couldn't consume control data. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise RuntimeError("Unable to serve control data") from err
+
+        if master_order is not None:
+            self.history_cache.set(serial, master_order)
+            self.notification_hub.publish(serial, NotificationHub.HISTORY)
+        return master_order, schedule_order
+
+    def _serve_order_transact_items(self, serial: str, order: MasterData) -> list:
+        """
+        [For internal use only] Builds the TransactWriteItems entries that move an
+        order from the Master Order Table to the Master History Table. The removal
+        is conditional on the order being unchanged, so that the transaction is
+        cancelled if the order was already served.
+        """
+        assert (
+            self.master_order_table is not None
+            and self.master_history_table is not None
+        ), "Master Tables not loaded, call load_tables()"
+        entry = order.model_dump()
+        entry["Serial_Number"] = serial
+        return [
+            {
+                "Put": {
+                    "TableName": self.master_history_table.name,
+                    "Item": entry,
+                }
+            },
+            {
+                "Delete": {
+                    "TableName": self.master_order_table.name,
+                    "Key": {"Serial_Number": serial},
+                    "ConditionExpression": "updates = :updates"
+                    + " AND user_touch_allowed = :user_touch_allowed",
+                    "ExpressionAttributeValues": {
+                        ":updates": entry["updates"],
+                        ":user_touch_allowed": entry["user_touch_allowed"],
+                    },
+                }
+            },
+        ]
+
+    @staticmethod
+    def _is_condition_cancellation(err: ClientError) -> bool:
+        """
+        [For internal use only] Checks whether a transaction was cancelled because
+        one of its condition checks failed.
+        """
+        reasons = err.response.get("CancellationReasons", [])
+        return err.response["Error"]["Code"] == "TransactionCanceledException" and any(
+            reason.get("Code") == "ConditionalCheckFailed" for reason in reasons
+        )
+
+    def _batch_get_items(self, tables: list, key: dict) -> dict[str, dict]:
+        """
+        [For internal use only] Gets the item with the given key from each of the
+        given tables in a single BatchGetItem call, retrying any unprocessed keys.
+        Returns a dictionary mapping table names to the items that were found.
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS.
+        Raises a RuntimeError if keys remain unprocessed after retrying.
+        """
+        request = {table.name: {"Keys": [key]} for table in tables}
+        items: dict[str, dict] = {}
+        for _ in range(self.MAX_BATCH_ATTEMPTS):
+            response = self.dyn_resource.batch_get_item(RequestItems=request)
+            for table_name, found in response.get("Responses", {}).items():
+                if found:
+                    items[table_name] = found[0]
+            request = response.get("UnprocessedKeys")
+            if not request:
+                return items
+        raise RuntimeError("Unable to read all items from AWS DynamoDB")
+
+    @staticmethod
+    def _device_query_kwargs(
+        serial: str,
+        start: str | None,
+        end: str | None,
+        limit: int | None,
+        newest_first: bool,
+        start_key: dict | None,
+    ) -> dict:
+        """
+        [For internal use only] Returns the arguments of a query of the Device Table.
+        """
+        key_condition = Key("Serial_Number").eq(serial)
+        if start is not None and end is not None:
+            key_condition &= Key("Local_Time_Str").between(start, end)
+        elif start is not None:
+            key_condition &= Key("Local_Time_Str").gte(start)
+        elif end is not None:
+            key_condition &= Key("Local_Time_Str").lte(end)
+
+        kwargs: dict = {
+            "KeyConditionExpression": key_condition,
+            "ScanIndexForward": not newest_first,
+        }
+        if limit is not None:
+            kwargs["Limit"] = limit
+        if start_key is not None:
+            kwargs["ExclusiveStartKey"] = start_key
+        return kwargs
+
+    @staticmethod
+    def _device_item_key(item: dict) -> tuple[str, str]:
+        """
+        [For internal use only] Returns the key of an item of the Device Table.
+        """
+        return item["Serial_Number"], item["Local_Time_Str"]
+
+    @classmethod
+    def _unique_device_items(
+        cls, data: list[DeviceData]
+    ) -> dict[tuple[str, str], dict]:
+        """
+        [For internal use only] Returns the items of the given device data by key,
+        keeping the last item of each key (BatchWriteItem rejects duplicate keys).
+        """
+        items = (dt.model_dump() for dt in data)
+        return {cls._device_item_key(item): item for item in items}
+
+    def _batch_write_device_items(self, items: list[dict]) -> set[tuple[str, str]]:
+        """
+        [For internal use only] Puts up to BATCH_WRITE_SIZE items into the Device
+        Table with a BatchWriteItem call, retrying unprocessed items with a backoff.
+        Returns the keys of the items that were written.
+        """
+        assert self.device_table is not None, "Device Table not loaded"
+        table_name = self.device_table.name
+        request = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+        pending = {self._device_item_key(item) for item in items}
+        for attempt in range(self.MAX_BATCH_ATTEMPTS):
+            if attempt:
+                time.sleep(self.BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                response = self.dyn_resource.batch_write_item(RequestItems=request)
+            except ClientError as err:
+                logger.error(
+                    "Couldn't batch write device data. Here's why: %s: %s",
+                    err.response["Error"]["Code"],
+                    err.response["Error"]["Message"],
+                )
+                break
+            request = response.get("UnprocessedItems")
+            pending = {
+                self._device_item_key(write["PutRequest"]["Item"])
+                for write in (request or {}).get(table_name, [])
+            }
+            if not pending:
+                break
+        return {self._device_item_key(item) for item in items} - pending
+
+    def _batch_write_items(self, request_items: dict[str, list[dict]]) -> None:
+        """
+        [For internal use only] Sends the given write requests (by table name) with
+        BatchWriteItem calls of at most BATCH_WRITE_SIZE requests, retrying
+        unprocessed requests with a backoff.
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS.
+        Raises a RuntimeError if requests remain unprocessed after retrying.
+        """
+        writes = [
+            (table_name, write)
+            for table_name, table_writes in request_items.items()
+            for write in table_writes
+        ]
+        for start in range(0, len(writes), self.BATCH_WRITE_SIZE):
+            pending: dict[str, list[dict]] = {}
+            for table_name, write in writes[start : start + self.BATCH_WRITE_SIZE]:
+                pending.setdefault(table_name, []).append(write)
+            for attempt in range(self.MAX_BATCH_ATTEMPTS):
+                if attempt:
+                    time.sleep(self.BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+                response = self.dyn_resource.batch_write_item(RequestItems=pending)
+                pending = response.get("UnprocessedItems")
+                if not pending:
+                    break
+            else:
+                raise RuntimeError("Unable to write all items to AWS DynamoDB")
+
+    def _transact_write_items(self, transact_items: list) -> None:
+        """
+        [For internal use only] Applies the given write requests atomically with a
+        single TransactWriteItems call. The resource's client takes care of
+        converting the items to DynamoDB's attribute value format.
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS or if the transaction
+        is cancelled.
+        """
+        self.dyn_resource.meta.client.transact_write_items(TransactItems=transact_items)
+
     def handle_interrupt_signal(self, serial: str, update: DeviceParamters) -> None:
         """
         Called when user changes the device state from directly the device.
@@ -484,6 +953,7 @@ class DeviceDataManager:
             self._update_master_state(serial, update)
         except ClientError as err:
             raise ValueError("Encountered AWS's wrath") from err
+        self.notification_hub.publish(serial, NotificationHub.HISTORY)
 
     def _update_master_state(self, serial: str, new_params: DeviceParamters) -> None:
         """
@@ -496,18 +966,15 @@ class DeviceDataManager:
         """
         if self.master_history_table is None:
             raise RuntimeError("Master History Table not loaded!")
+        # Previous state is usually served from the history cache
+        old = self.get_master_data(serial, "History")
+        state = MasterData(
+            updates=new_params,
+            user_touch_allowed=old.user_touch_allowed if old is not None else True,
+        )
         try:
-            # FIXME (Add a slow fix for fetch-control interrupt)
-            old = self.get_master_data(serial, "History")
-
-            entry = {
-                "Serial_Number": serial,
-                "updates": new_params.model_dump(),
-                "user_touch_allowed": old.user_touch_allowed
-                if old is not None
-                else True,
-            }
-            # FIXME
+            entry = state.model_dump()
+            entry["Serial_Number"] = serial
             self.master_history_table.put_item(Item=entry)
 
             # self.master_order_table.update_item(
@@ -516,12 +983,14 @@ class DeviceDataManager:
             #     ExpressionAttributeValues={":new_state": new_params.model_dump()},
             # )
         except ClientError as err:
+            self.history_cache.invalidate(serial)
             logger.error(
                 "Couldn't update state in order table. Here's why: %s: %s",
                 err.response["Error"]["Code"],
                 err.response["Error"]["Message"],
             )
             raise ValueError("Issue encountered with AWS DynamoDB") from err
+        self.history_cache.set(serial, state)
 
     def _remove_master_history(self, serial: str) -> None:
         """
@@ -536,7 +1005,10 @@ class DeviceDataManager:
         try:
             self.master_history_table.delete_item(Key={"Serial_Number": serial})
         except ClientError as err:
+            self.history_cache.invalidate(serial)
             raise RuntimeError("DynamoDB, chill dude. Go smoke like Angaa") from err
+        self.history_cache.set(serial, None)
+        self.notification_hub.publish(serial, NotificationHub.HISTORY)
 
     ### Schedule Control Management ###
     def put_schedule(self, serial: str, data: ScheduleData) -> dict | None:
@@ -544,34 +1016,59 @@ class DeviceDataManager:
         Puts an item into the Schedule Table. If succesful returns the item
         (in a dict), else if the scehdule is invalid, it throws a ValueError.
 
+        The device's schedules that have not ended are read once, from a sort key
+        range query up to the end of the schedule and a query of its recurring
+        schedules. The overlap check and the choice of the next schedule (put in
+        the Schedule Control Table) are both made from them, and the schedule, its
+        control and the schedules' version are written in a single transaction. The
+        control is left as is if the schedule has already ended.
+
+        A recurring schedule is stored as a single item, its occurrences being
+        expanded lazily: other schedules may take place between them (e.g. during
+        the day for a nightly schedule). Only its current (or next) occurrence is
+        put in the Schedule Control Table.
+
         # Exceptions
         Raises a RuntimeError if the Schedule Table is not loaded.
         Raises a ValueError if invalid schedule or an issue with AWS
         """
         if self.schedule_table is None:
             raise RuntimeError("Schedule Table not loaded!")
+        if self.schedule_control_table is None:
+            raise RuntimeError("Schedule Control Table not loaded!")
+        entry = self._schedule_entry(serial, data)
+        now = datetime.now(UTC)
+        # Schedules starting after this one (or now, if it has ended) ends can't
+        # overlap it, nor come first
+        end_time = max(data.series_end(), now).astimezone(self.standard_timezone)
         try:
-            if not (self._validate_schedule(serial, data.start_time, data.end_time)):
+            singles = self._active_schedules(serial, end_time.isoformat(), now)
+            series = self._active_series(serial, now)
+            if self._schedule_overlaps(data, singles, series, now):
                 raise ValueError("Schedule is invalid!")
-            # If valid, add Serial Number to data entry, convert to the standard
-            # timezone, then to a string to be stored in the database.
-            entry = data.model_dump()
-            entry["Serial_Number"] = serial
-
-            entry["start_time"] = data.start_time.astimezone(
-                self.standard_timezone
-            ).isoformat()
-
-            entry["end_time"] = data.end_time.astimezone(
-                self.standard_timezone
-            ).isoformat()
-
-            self.schedule_table.put_item(Item=entry)
-            return self._refresh_schedule_control(serial)
-
+            latest = None
+            if self._schedule_occurrence(entry, now) is not None:
+                latest = self._next_occurrence([*singles, *series, entry], now)
+            transact_items = [
+                {"Put": {"TableName": self.schedule_table.name, "Item": entry}},
+                self._schedule_version_bump(serial),
+            ]
+            if latest is not None:
+                transact_items.append(
+                    {
+                        "Put": {
+                            "TableName": self.schedule_control_table.name,
+                            "Item": latest,
+                        }
+                    }
+                )
+            self._transact_write_items(transact_items)
         except ClientError as err:
             raise RuntimeError("Problem encountered with AWS") from err
 
+        self.notification_hub.publish(serial, NotificationHub.CONTROL)
+        return latest
+
     def get_schedule_control(self, serial: str) -> ScheduleData:
         """
         Gets the current schedule for a device.
@@ -622,7 +1119,9 @@ class DeviceDataManager:
 
     def get_schedules(self, serial: str) -> list[ScheduleData]:
         """
-        Gets all schedules for a device.
+        Gets all schedules for a device. Recurring schedules start from their
+        current (or next) occurrence, the following ones being expanded lazily
+        (see ScheduleData.remaining).
 
         # Exceptions
         Raises a Runtime Error if the Schedule Table is not loaded or if
@@ -631,27 +1130,122 @@ class DeviceDataManager:
         if self.schedule_table is None:
             raise RuntimeError("Schedule Table not loaded!")
         try:
-            self._refresh_schedules(serial)
-            response = self.schedule_table.query(
-                KeyConditionExpression=(Key("Serial_Number").eq(serial))
-            )
+            _, active = self._split_schedules(self._query_schedules(serial))
         except ClientError as err:
             raise RuntimeError("AWS CLient Error: Item not found") from err
-        else:
-            return [ScheduleData(**schedule) for schedule in response.get("Items")]
+
+        now = datetime.now(UTC)
+        return sorted(
+            (
+                schedule
+                for schedule in (ScheduleData(**item).remaining(now) for item in active)
+                if schedule is not None
+            ),
+            key=lambda schedule: schedule.start_time,
+        )
+
+    def get_schedules_version(self, serial: str) -> tuple[int, Decimal | None]:
+        """
+        Gets the version of a device's schedules (0 if never written), and until
+        when (in seconds since the epoch) get_schedules is known to return the same
+        schedules (None if unknown, or passed). Lets a client's copy of the schedules
+        be checked with a single read, rather than querying them.
+
+        # Exceptions
+        Raises a RuntimeError if the Schedule Control Table is not loaded, or if
+        there is an issue with AWS.
+        """
+        if self.schedule_control_table is None:
+            raise RuntimeError("Schedule Control Table not loaded!")
+        try:
+            response = self.schedule_control_table.get_item(
+                Key={"Serial_Number": self._version_key(serial)}
+            )
+        except ClientError as err:
+            raise RuntimeError("Unable to get the schedules' version") from err
+        item = response.get("Item", {})
+        version = int(item.get("schedule_version", 0))
+        valid_until = item.get("valid_until")
+        if valid_until is None or valid_until < self._epoch(datetime.now(UTC)):
+            return version, None
+        return version, valid_until
+
+    def record_schedules_version(
+        self, serial: str, version: int, schedules: list[ScheduleData]
+    ) -> None:
+        """
+        Records until when the given schedules (from get_schedules, read after
+        getting the version) stay the same, unless the version has changed since.
+
+        # Exceptions
+        Raises a RuntimeError if the Schedule Control Table is not loaded, or if
+        there is an issue with AWS.
+        """
+        if self.schedule_control_table is None:
+            raise RuntimeError("Schedule Control Table not loaded!")
+        try:
+            self.schedule_control_table.update_item(
+                Key={"Serial_Number": self._version_key(serial)},
+                UpdateExpression="SET schedule_version = :version, "
+                + "valid_until = :valid_until",
+                ConditionExpression=Attr("schedule_version").not_exists()
+                | Attr("schedule_version").eq(version),
+                ExpressionAttributeValues={
+                    ":version": version,
+                    ":valid_until": self.schedules_valid_until(schedules),
+                },
+            )
+        except ClientError as err:
+            # The schedules were written in the meantime, their version is newer
+            if err.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise RuntimeError("Unable to record the schedules' version") from err
+
+    @classmethod
+    def schedules_valid_until(cls, schedules: list[ScheduleData]) -> Decimal:
+        """
+        Returns until when (in seconds since the epoch) the given schedules, from
+        get_schedules, stay the same: the first end of one of their occurrences.
+        """
+        return cls._epoch(
+            min(
+                (schedule.end_time for schedule in schedules),
+                default=datetime.max.replace(tzinfo=UTC),
+            )
+        )
+
+    def _version_key(self, serial: str) -> str:
+        """
+        [For internal use only] Returns the key of the item of the Schedule Control
+        Table holding the version of the device's schedules.
+        """
+        return serial + self.SCHEDULE_VERSION_SUFFIX
+
+    def _schedule_version_bump(self, serial: str) -> dict:
+        """
+        [For internal use only] Returns the request bumping the version of the
+        device's schedules (forgetting until when they stay the same), for
+        _transact_write_items.
+        """
+        assert self.schedule_control_table is not None, "Schedule Control not loaded"
+        return {
+            "Update": {
+                "TableName": self.schedule_control_table.name,
+                "Key": {"Serial_Number": self._version_key(serial)},
+                "UpdateExpression": "ADD schedule_version :one REMOVE valid_until",
+                "ExpressionAttributeValues": {":one": 1},
+            }
+        }
 
     def _refresh_schedules(self, serial: str) -> dict | None:
         """
         [For internal use only]
 
-        Goes through the Schedule Table and removes any
-        scheduled sessions that have already ended.
+        Goes through the Schedule Table, skipping any scheduled
+        sessions that have already ended (see sweep_expired_schedules).
 
         If there is a future schedule,
-        returns the entry for that schedule, otherwise returns None.
-
-        This method should be called everytime the schedule table is to be
-        read or written to.
+        returns the entry for that schedule (its current or next occurrence, if
+        recurring), otherwise returns None.
 
         # Exceptions
         Raises a RuntimeError if the Schedule Table is not loaded.
@@ -660,123 +1254,413 @@ class DeviceDataManager:
         if self.schedule_table is None:
             raise RuntimeError("Schedule Table not loaded!")
         try:
-            response = self.schedule_table.query(
-                KeyConditionExpression=(Key("Serial_Number").eq(serial))
-            )
-            for item in response["Items"]:
-                if (datetime.fromisoformat(item["end_time"])) < (
-                    datetime.now(timezone.utc)
-                ):
-                    self.schedule_table.delete_item(
-                        Key={"Serial_Number": serial, "start_time": item["start_time"]}
-                    )
-                # End iteration and return the first future schedule
-                else:
-                    return item
-            return None
+            _, active = self._split_schedules(self._query_schedules(serial))
         except ClientError as err:
             raise ValueError(f"Item not found for Serial Number: {serial}") from err
+        return self._next_occurrence(active, datetime.now(UTC))
 
-    def _refresh_schedule_control(self, serial: str) -> dict | None:
+    def _query_schedules(self, serial: str) -> list[dict]:
         """
-        [For internal use only] Fetches the latest schedule from the
-        Schedule Table if it exists and updates the Schedule Control
-        Table with it. If a schedule doesn't exist,
-        it removes the entry from the Schedule Control Table
-        (if it exists in the control table).
+        [For internal use only] Gets all items of a device from the Schedule Table,
+        sorted by start time, in a single query of each partition (the device's
+        and its recurring schedules', unless larger than a page).
 
         # Exceptions
-        Raises a RuntimeError if the Schedule Control Table is not loaded.
-        Raises a ValueError if error with AWS.
+        Raises a ClientError if there is an issue with AWS.
         """
-        # Grab the schedule with the earliest start time
-        latest = self._refresh_schedules(serial)
-        # Push that to Control Table
-        if self.schedule_control_table is None:
-            raise RuntimeError("Schedule Control Table not loaded!")
-        try:
-            if latest:
-                latest["Serial_Number"] = serial
-                self.schedule_control_table.put_item(Item=latest)
-                return latest
-            else:
-                self.schedule_control_table.delete_item(Key={"Serial_Number": serial})
-                return None
-        except ClientError as err:
-            raise ValueError("Error in AWS: Could not update Schedule Control") from err
+        items: list[dict] = []
+        for partition in (serial, self._series_partition(serial)):
+            items += self._query_all(
+                KeyConditionExpression=Key("Serial_Number").eq(partition)
+            )
+        return sorted(items, key=lambda item: item["start_time"])
 
-    def _validate_schedule(
-        self, serial: str, start_time: datetime, end_time: datetime
-    ) -> bool:
+    def _query_all(self, **kwargs) -> list[dict]:
         """
-        [For internal use only] Checks if the schedule is valid.
-        If a schedule overlaps with any other return False, else return True.
+        [For internal use only] Gets all items of a query of the Schedule Table,
+        going through its pages.
 
         # Exceptions
-        Raises a RuntimeError if the Schedule Table is not loaded.
-        Raises a ValueError if issue with AWS
+        Raises a ClientError if there is an issue with AWS.
+        """
+        assert self.schedule_table is not None, "Schedule Table not loaded"
+        items: list[dict] = []
+        while True:
+            response = self.schedule_table.query(**kwargs)
+            items += response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def sweep_expired_schedules(self) -> int:
+        """
+        Removes the schedules that have ended from the Schedule Table (across all
+        devices), scanning it and deleting them in batches. Returns the number of
+        removed schedules.
+
+        Reads skip ended schedules without removing them, DynamoDB's TTL (on
+        SCHEDULE_TTL_ATTRIBUTE) removes them eventually. This catches up on items
+        it doesn't remove (e.g. written without the TTL), and is not run by the API:
+        run it from a single scheduled job (see the app.database.sweep module),
+        since it scans the whole table.
+
+        # Exceptions
+        Raises a RuntimeError if the Schedule Table is not loaded, or if there is
+        an issue with AWS.
         """
-        self._refresh_schedules(serial)
         if self.schedule_table is None:
             raise RuntimeError("Schedule Table not loaded!")
+        kwargs = self._expired_schedules_scan_kwargs(datetime.now(UTC))
+        removed = 0
         try:
-            schedule_list = self.schedule_table.query(
-                KeyConditionExpression=(Key("Serial_Number").eq(serial))
-            )["Items"]
+            while True:
+                response = self.schedule_table.scan(**kwargs)
+                expired, _ = self._split_schedules(response.get("Items", []))
+                if expired:
+                    self._batch_write_items(
+                        {self.schedule_table.name: self._schedule_deletes(expired)}
+                    )
+                    removed += len(expired)
+                if "LastEvaluatedKey" not in response:
+                    return removed
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
         except ClientError as err:
-            raise ValueError("Item not found") from err
+            logger.error(
+                "Couldn't sweep expired schedules. Here's why: %s: %s",
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise RuntimeError("Unable to sweep expired schedules") from err
 
-        for item in schedule_list:
-            # Return False if the schedule overlaps with any other schedule
-            """
-            Refer to https://stackoverflow.com/questions/143552/comparing-date-ranges/143568#143568
-            & https://stackoverflow.com/questions/12283559/find-overlapping-appointments-in-on-time
-            """
-            start_check = datetime.fromisoformat(item["start_time"])
-            end_check = datetime.fromisoformat(item["end_time"])
-            # Conflict only occurs if e_2 < s_1 or e_1 < s_2;
-            if not ((start_time > end_check) or (end_time < start_check)):
-                return False
-        return True
+    @classmethod
+    def _expired_schedules_scan_kwargs(cls, now: datetime) -> dict:
+        """
+        [For internal use only] Returns the arguments of a scan of the Schedule
+        Table for the keys and times of the schedules that ended before the given
+        time (or written without their times in seconds, which are then parsed).
+        """
+        end_epoch = Attr("end_epoch")
+        return {
+            "FilterExpression": end_epoch.lt(cls._epoch(now)) | end_epoch.not_exists(),
+            "ProjectionExpression": (
+                "Serial_Number, start_time, end_time, start_epoch, end_epoch"
+            ),
+        }
+
+    def _schedule_overlaps(
+        self, data: ScheduleData, singles: list[dict], series: list[dict], now: datetime
+    ) -> bool:
+        """
+        [For internal use only] Checks whether an occurrence of a schedule overlaps
+        with one of the given schedules of the device, that have not ended: the ones
+        that are not recurring from the last one to start (see _active_schedules),
+        and the recurring ones (see _active_series).
+
+        The schedules that are not recurring never overlap each other, so sorted by
+        start time they are also sorted by end time: going backwards from the end
+        of the schedule (its last occurrence's), the ones starting before it can't
+        overlap. Recurring schedules starting after it ends are skipped.
+        """
+        start_time = data.start_time.astimezone(self.standard_timezone).isoformat()
+        end_time = data.series_end().astimezone(self.standard_timezone).isoformat()
+        for item in singles:
+            if item["start_time"] > end_time:
+                continue
+            if data.overlaps(ScheduleData(**item), now):
+                return True
+            if item["start_time"] <= start_time:
+                break
+        return any(
+            data.overlaps(ScheduleData(**item), now)
+            for item in series
+            if item["start_time"] <= end_time
+        )
+
+    def _active_schedules(
+        self, serial: str, start_time: str, now: datetime
+    ) -> list[dict]:
+        """
+        [For internal use only] Gets the device's schedules that are not recurring
+        and have not ended, starting at or before the given start time, from the
+        last one to start down to the one running now (if any).
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS.
+        """
+        now_time = now.astimezone(self.standard_timezone).isoformat()
+        items = []
+        for item in self._active_schedules_before(serial, start_time):
+            items.append(item)
+            if item["start_time"] <= now_time:
+                break
+        return items
+
+    def _active_schedules_before(self, serial: str, start_time: str) -> Iterator[dict]:
+        """
+        [For internal use only] Yields the device's schedules that are not recurring
+        and have not ended, starting at or before the given start time, from the
+        last one to start.
+
+        Ended schedules are kept until their TTL removes them, and may start after
+        schedules that have not ended (e.g. one that started in the past). The query
+        goes backwards past them, SCHEDULE_QUERY_PAGE items at a time, filtering
+        them out.
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS.
+        """
+        assert self.schedule_table is not None, "Schedule Table not loaded"
+        now = self._epoch(datetime.now(UTC))
+        end_epoch = Attr("end_epoch")
+        kwargs = self._schedule_neighbour_kwargs(serial, start_time)
+        kwargs["FilterExpression"] = end_epoch.gte(now) | end_epoch.not_exists()
+        kwargs["Limit"] = self.SCHEDULE_QUERY_PAGE
+        while True:
+            response = self.schedule_table.query(**kwargs)
+            for item in response.get("Items", []):
+                # Items written without their times in seconds are only parsed here
+                if self._schedule_epochs(item)[1] >= now:
+                    yield item
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _active_series(self, serial: str, after: datetime) -> list[dict]:
+        """
+        [For internal use only] Gets the device's recurring schedules ending (their
+        last occurrence) after the given time.
+
+        # Exceptions
+        Raises a ClientError if there is an issue with AWS.
+        """
+        return self._query_all(
+            KeyConditionExpression=Key("Serial_Number").eq(
+                self._series_partition(serial)
+            ),
+            FilterExpression=Attr("end_epoch").gte(self._epoch(after)),
+        )
+
+    def _next_occurrence(self, items: list[dict], now: datetime) -> dict | None:
+        """
+        [For internal use only] Returns the occurrence of the given items of the
+        Schedule Table that is running at the given time, or else the next one to
+        start, as an item of the Schedule Control Table (None if there is none).
+        """
+        occurrences = [
+            occurrence
+            for occurrence in (self._schedule_occurrence(item, now) for item in items)
+            if occurrence is not None
+        ]
+        return min(occurrences, key=lambda item: item["start_time"], default=None)
+
+    def _series_partition(self, serial: str) -> str:
+        """
+        [For internal use only] Returns the partition key of the device's recurring
+        schedules in the Schedule Table.
+        """
+        return serial + self.SCHEDULE_SERIES_SUFFIX
+
+    def _schedule_entry(self, serial: str, data: ScheduleData) -> dict:
+        """
+        [For internal use only] Returns the item of the Schedule Table for the given
+        schedule, its times converted to the standard timezone (as strings, the
+        start time being the sort key) and to seconds since the epoch (the end
+        being the last occurrence's, for a recurring schedule, which is put in the
+        partition of the device's recurring schedules).
+        """
+        entry = data.model_dump()
+        entry["Serial_Number"] = (
+            self._series_partition(serial) if data.recurrence is not None else serial
+        )
+        entry["start_time"] = data.start_time.astimezone(
+            self.standard_timezone
+        ).isoformat()
+        entry["end_time"] = data.end_time.astimezone(self.standard_timezone).isoformat()
+        entry["start_epoch"] = self._epoch(data.start_time)
+        entry["end_epoch"] = self._epoch(data.series_end())
+        entry[self.SCHEDULE_TTL_ATTRIBUTE] = math.ceil(data.series_end().timestamp())
+        return entry
+
+    def _schedule_occurrence(self, item: dict, now: datetime) -> dict | None:
+        """
+        [For internal use only] Returns the occurrence of an item of the Schedule
+        Table that has not ended at the given time (the item itself, unless
+        recurring), as an item of the Schedule Control Table. Returns None if all
+        occurrences have ended.
+        """
+        if not item.get("recurrence"):
+            return item
+        schedule = ScheduleData(**item)
+        index = schedule.next_occurrence(now)
+        if index is None:
+            return None
+        start, end = schedule.occurrence(index)
+        occurrence = {key: value for key, value in item.items() if key != "recurrence"}
+        occurrence["Serial_Number"] = item["Serial_Number"].removesuffix(
+            self.SCHEDULE_SERIES_SUFFIX
+        )
+        occurrence["start_time"] = start.astimezone(self.standard_timezone).isoformat()
+        occurrence["end_time"] = end.astimezone(self.standard_timezone).isoformat()
+        occurrence["start_epoch"] = self._epoch(start)
+        occurrence["end_epoch"] = self._epoch(end)
+        occurrence[self.SCHEDULE_TTL_ATTRIBUTE] = math.ceil(end.timestamp())
+        return occurrence
+
+    @staticmethod
+    def _epoch(moment: datetime) -> Decimal:
+        """
+        [For internal use only] Returns a time in seconds since the epoch, as stored
+        in the Schedule Table.
+        """
+        return Decimal(str(moment.timestamp()))
+
+    @classmethod
+    def _schedule_epochs(cls, item: dict) -> tuple[Decimal, Decimal]:
+        """
+        [For internal use only] Returns the start and end of an item of the Schedule
+        Table in seconds since the epoch. Items written before these were stored
+        have their times parsed instead.
+        """
+        if "start_epoch" in item and "end_epoch" in item:
+            return Decimal(item["start_epoch"]), Decimal(item["end_epoch"])
+        return (
+            cls._epoch(datetime.fromisoformat(item["start_time"])),
+            cls._epoch(datetime.fromisoformat(item["end_time"])),
+        )
+
+    @staticmethod
+    def _schedule_neighbour_kwargs(serial: str, start_time: str) -> dict:
+        """
+        [For internal use only] Returns the arguments of a query for the device's
+        schedule starting last at or before the given start time.
+        """
+        return {
+            "KeyConditionExpression": Key("Serial_Number").eq(serial)
+            & Key("start_time").lte(start_time),
+            "ScanIndexForward": False,
+            "Limit": 1,
+        }
+
+    @classmethod
+    def _split_schedules(cls, items: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        [For internal use only] Splits items of the Schedule Table into the ones
+        that have already ended and the others (in the given order).
+        """
+        now = cls._epoch(datetime.now(UTC))
+        expired: list[dict] = []
+        active: list[dict] = []
+        for item in items:
+            if cls._schedule_epochs(item)[1] < now:
+                expired.append(item)
+            else:
+                active.append(item)
+        return expired, active
+
+    @staticmethod
+    def _schedule_deletes(items: list[dict]) -> list[dict]:
+        """
+        [For internal use only] Returns the requests deleting the given items of the
+        Schedule Table, for _batch_write_items.
+        """
+        return [
+            {
+                "DeleteRequest": {
+                    "Key": {
+                        "Serial_Number": item["Serial_Number"],
+                        "start_time": item["start_time"],
+                    }
+                }
+            }
+            for item in items
+        ]
+
+    @staticmethod
+    def _find_recurring_schedule(items: list[dict], start_time: str) -> dict | None:
+        """
+        [For internal use only] Finds the recurring schedule, among the given items
+        of the Schedule Table that have not ended, with an occurrence starting at
+        the given time.
+        """
+        moment = datetime.fromisoformat(start_time)
+        for item in items:
+            if item.get("recurrence") and (
+                ScheduleData(**item).find_occurrence(moment) is not None
+            ):
+                return item
+        return None
 
     def remove_schedule(self, serial: str, start_time: datetime | str) -> ScheduleData:
         """
-        Removes an item from the Schedule Table.
+        Removes an item from the Schedule Table, and updates the Schedule Control
+        Table with the next schedule and the schedules' version (in a single
+        transaction). The device's
+        schedules are read once. The start time of any occurrence of a recurring
+        schedule removes the whole schedule.
 
         # Exceptions
         Raises a RuntimeError if the Schedule Table is not loaded, or if there is
         an issue with AWS.
         Raises a ValueError if issues with handling the input start times, such
-        as converting timezones or converting types.
+        as converting timezones or converting types, or if the schedule is not found
+        (or has ended).
         """
         if self.schedule_table is None:
             raise RuntimeError("Schedule Table not loaded!")
+        if self.schedule_control_table is None:
+            raise RuntimeError("Schedule Control Table not loaded!")
         try:
             # Convert start_time to standard timezone, and then to a string for querying
             if isinstance(start_time, str):
-                start_time = (
-                    datetime.fromisoformat(start_time)
-                    .astimezone(self.standard_timezone)
-                    .isoformat()
-                )
-
-            if isinstance(start_time, datetime):
-                start_time = start_time.astimezone(self.standard_timezone).isoformat()
+                start_time = datetime.fromisoformat(start_time)
+            start_time = start_time.astimezone(self.standard_timezone).isoformat()
+        except Exception as err:
+            raise ValueError("Failed in converting timezones, or in querying") from err
 
-            response = self.schedule_table.delete_item(
-                Key={"Serial_Number": serial, "start_time": start_time},
-                ReturnValues="ALL_OLD",
+        try:
+            # Ended schedules are skipped, as by reads (and removed by their TTL)
+            _, active = self._split_schedules(self._query_schedules(serial))
+            by_start_time = {item["start_time"]: item for item in active}
+            removed = by_start_time.get(start_time)
+            if removed is None:
+                removed = self._find_recurring_schedule(active, start_time)
+            if removed is None:
+                raise ValueError("Schedule not found")
+            remaining = [item for item in active if item is not removed]
+            control_table = self.schedule_control_table.name
+            latest = self._next_occurrence(remaining, datetime.now(UTC))
+            control_write = (
+                {"Put": {"TableName": control_table, "Item": latest}}
+                if latest is not None
+                else {
+                    "Delete": {
+                        "TableName": control_table,
+                        "Key": {"Serial_Number": serial},
+                    }
+                }
+            )
+            self._transact_write_items(
+                [
+                    {
+                        "Delete": {
+                            "TableName": self.schedule_table.name,
+                            "Key": {
+                                "Serial_Number": removed["Serial_Number"],
+                                "start_time": removed["start_time"],
+                            },
+                        }
+                    },
+                    control_write,
+                    self._schedule_version_bump(serial),
+                ]
             )
-
-            self._refresh_schedule_control(serial)
-
         except ClientError as err:
             raise RuntimeError("AWS's problem, probably also ours though") from err
-        except Exception as err:
-            raise ValueError("Failed in converting timezones, or in querying") from err
+
+        self.notification_hub.publish(serial, NotificationHub.CONTROL)
 
         try:
-            return ScheduleData(**response.get("Attributes"))
+            return ScheduleData(**removed)
         except Exception as err:
             raise RuntimeError(
                 "Failed to convert response from AWS to ScheduleData."
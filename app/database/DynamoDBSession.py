@@ -0,0 +1,63 @@
+import threading
+
+import boto3
+from botocore.config import Config
+
+from ..internal.config import Settings
+
+
+def _config_options() -> dict:
+    """
+    [For internal use only] Connection pool, timeout and retry settings of the
+    clients (see Settings).
+    """
+    return {
+        "max_pool_connections": Settings.AWS_MAX_POOL_CONNECTIONS,
+        "tcp_keepalive": Settings.AWS_TCP_KEEPALIVE,
+        "connect_timeout": Settings.AWS_CONNECT_TIMEOUT,
+        "read_timeout": Settings.AWS_READ_TIMEOUT,
+        "retries": {
+            "mode": Settings.AWS_RETRY_MODE,
+            "max_attempts": Settings.AWS_MAX_ATTEMPTS,
+        },
+    }
+
+
+class DynamoDBSession:
+    """
+    Single AWS session shared by all data managers of the process. Hands out their
+    DynamoDB resource, one per thread since boto3 resources (and their tables) are
+    not thread-safe.
+
+    Connections are tuned by the AWS_* settings. Each resource has its own client
+    and connection pool, shared by the managers (and tables) of its thread. A thread
+    makes one call at a time, so the pool's size (AWS_MAX_POOL_CONNECTIONS) is per
+    thread and only needs to be small: the process's connections are bounded by
+    the number of threads (see DB_THREADPOOL_SIZE) instead.
+    """
+
+    def __init__(
+        self, region_name: str, aws_access_key_id: str, aws_secret_access_key: str
+    ):
+        self._session = boto3.session.Session(
+            region_name=region_name,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+        )
+        # Sessions are not thread-safe, resources are created one at a time
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def resource(self):
+        """
+        Returns the boto3 DynamoDB resource of the calling thread, creating it on
+        first use. It must not be used from other threads.
+        """
+        resource = getattr(self._local, "resource", None)
+        if resource is None:
+            with self._lock:
+                resource = self._session.resource(
+                    "dynamodb", config=Config(**_config_options())
+                )
+            self._local.resource = resource
+        return resource
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import threading
+
+
+class NotificationHub:
+    """
+    In-process hub used to wake up requests waiting for changes to a device's data.
+    Every (serial, topic) pair has a version that is bumped each time a change is
+    published, waiters are woken up even if the change is published from another
+    thread.
+
+    Note that the hub is not shared between processes, a waiter is only notified of
+    writes made through the same worker.
+    """
+
+    # Topics that can be published/waited on
+    CONTROL = "Control"  # Master orders and schedules pending for the device
+    HISTORY = "History"  # Device state in the Master History Table
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: dict[tuple[str, str], int] = {}
+        self._waiters: dict[
+            tuple[str, str], set[tuple[asyncio.AbstractEventLoop, asyncio.Future]]
+        ] = {}
+
+    def version(self, serial: str, topic: str) -> int:
+        """
+        Returns the current version of the given topic for a serial number.
+        """
+        with self._lock:
+            return self._versions.get((serial, topic), 0)
+
+    def publish(self, serial: str, *topics: str) -> None:
+        """
+        Bumps the version of the given topics for a serial number, and wakes up all
+        requests waiting on them. Safe to call from any thread.
+        """
+        woken = []
+        with self._lock:
+            for topic in topics:
+                key = (serial, topic)
+                self._versions[key] = self._versions.get(key, 0) + 1
+                for waiter in self._waiters.pop(key, ()):
+                    woken.append((*waiter, self._versions[key]))
+
+        for loop, future, version in woken:
+            # Event loop may already be closed, nothing left to wake up then
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(self._wake, future, version)
+
+    async def wait(
+        self, serial: str, topic: str, version: int, timeout: float | None = None
+    ) -> int:
+        """
+        Waits until the version of the topic for a serial number differs from the
+        given version, or until the timeout (in seconds) expires. Returns the
+        current version, which is unchanged if the wait timed out. Waits
+        indefinitely if no timeout is given.
+        """
+        key = (serial, topic)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            current = self._versions.get(key, 0)
+            if current != version:
+                return current
+            future = loop.create_future()
+            self._waiters.setdefault(key, set()).add((loop, future))
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            return self.version(serial, topic)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard((loop, future))
+                    if not waiters:
+                        del self._waiters[key]
+
+    @staticmethod
+    def _wake(future: asyncio.Future, version: int) -> None:
+        if not future.done():
+            future.set_result(version)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+
+from ..models.Device import DeviceData
+from .DeviceDataManager import DeviceDataManager
+from .ThreadPoolManager import ThreadPoolDataManager
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryBuffer:
+    """
+    Write-behind buffer of device data (telemetry). Items are queued in memory and
+    written in the background by BatchWriteItem calls, as soon as flush_size items
+    are queued or flush_interval seconds after the first one, whichever is first.
+
+    The queue is bounded, put waits for a free slot and gives up once the queue
+    stays full (backpressure). close writes the remaining items, queued items are
+    lost if the process dies before they are flushed.
+    """
+
+    def __init__(
+        self,
+        db: ThreadPoolDataManager[DeviceDataManager],
+        maxsize: int,
+        flush_interval: float,
+        flush_size: int = DeviceDataManager.BATCH_WRITE_SIZE,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._queue: asyncio.Queue[DeviceData | None] = asyncio.Queue(maxsize)
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self._counts = {"accepted": 0, "rejected": 0, "written": 0, "failed": 0}
+        self._flushes = 0
+
+    def start(self) -> None:
+        """
+        Starts flushing the queue in the background (in the running event loop).
+        """
+        assert self._task is None, "Telemetry buffer already started"
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, data: DeviceData, timeout: float = 0) -> bool:
+        """
+        Queues device data to be written, waiting up to timeout seconds for a free
+        slot. Returns False if the queue is full (or the buffer closed).
+        """
+        if self._closed:
+            self._counts["rejected"] += 1
+            return False
+        try:
+            if timeout > 0:
+                await asyncio.wait_for(self._queue.put(data), timeout)
+            else:
+                self._queue.put_nowait(data)
+        except (asyncio.QueueFull, TimeoutError):
+            self._counts["rejected"] += 1
+            return False
+        self._counts["accepted"] += 1
+        return True
+
+    async def close(self) -> None:
+        """
+        Stops accepting device data, and waits for the queued items to be written.
+        """
+        self._closed = True
+        if self._task is not None:
+            # Wakes up the flushing task, which stops once it dequeues it
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        # Items queued while stopping (or if the buffer was never started)
+        remaining = []
+        while not self._queue.empty():
+            data = self._queue.get_nowait()
+            if data is not None:
+                remaining.append(data)
+        for start in range(0, len(remaining), self.flush_size):
+            await self._flush(remaining[start : start + self.flush_size])
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the number of queued items, and counts of accepted, rejected (queue
+        full), written and failed items.
+        """
+        return {
+            "queued": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            **self._counts,
+            "flushes": self._flushes,
+        }
+
+    async def _run(self) -> None:
+        """
+        [For internal use only] Flushes the queue until close is called.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(self._queue.get(), remaining)
+                except TimeoutError:
+                    break
+                if data is None:
+                    stopping = True
+                    break
+                batch.append(data)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[DeviceData]) -> None:
+        """
+        [For internal use only] Writes a batch of device data, logging failures.
+        """
+        self._flushes += 1
+        try:
+            written = await self.db.put_device_data_batch(batch)
+        except Exception:
+            logger.exception("Couldn't flush %d device data items", len(batch))
+            written = [False] * len(batch)
+        failed = written.count(False)
+        self._counts["written"] += len(batch) - failed
+        self._counts["failed"] += failed
+        if failed:
+            logger.error("Dropped %d device data items, write failed", failed)
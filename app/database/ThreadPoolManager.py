@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generic, TypeVar
+
+M = TypeVar("M")
+
+
+class MeteredThreadPool:
+    """
+    Thread pool for running blocking calls from the event loop, keeping track of
+    how saturated it is (calls running/queued, and how long calls waited for a
+    free thread).
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "db"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._active = 0
+        self._peak_active = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking function in the pool, and returns its result.
+        """
+        with self._lock:
+            self._submitted += 1
+        call = functools.partial(self._call, time.monotonic(), func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns the saturation metrics of the pool. Calls are queued once all
+        max_workers threads are active, queue_wait_* are in seconds.
+        """
+        with self._lock:
+            started = self._completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._submitted - started,
+                "peak_active": self._peak_active,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "saturation": self._active / self.max_workers,
+                "queue_wait_avg": self._queue_wait_total / started if started else 0.0,
+                "queue_wait_max": self._queue_wait_max,
+            }
+
+    def shutdown(self) -> None:
+        """
+        Waits for the running calls to finish and stops the pool's threads.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _call(self, submitted_at: float, func, *args, **kwargs):
+        """
+        [For internal use only] Runs in a pool thread, recording the metrics.
+        """
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            self._active += 1
+            self._peak_active = max(self._peak_active, self._active)
+            self._queue_wait_total += waited
+            self._queue_wait_max = max(self._queue_wait_max, waited)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+
+class ThreadPoolDataManager(Generic[M]):
+    """
+    Wraps a (blocking) DeviceDataManager or UserDataManager so that it can be used
+    from the event loop: its methods become coroutines, run in the given thread
+    pool instead of on the event loop.
+
+    Since boto3 resources (and their tables) are not thread-safe, each thread calls
+    its own manager, created on first use by factory (which should bind it to the
+    thread's resource, see DynamoDBSession.resource). Other attributes (e.g. tables,
+    the notification hub and caches) are read from the manager of the thread that
+    created the wrapper.
+
+    The wrapper is read-only, to change the managers' attributes (e.g. in tests)
+    pass a factory that does so.
+    """
+
+    def __init__(self, factory: Callable[[], M], pool: MeteredThreadPool):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_local", threading.local())
+        object.__setattr__(self, "_manager", self._thread_manager())
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._manager, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self._pool.run(self._call, name, *args, **kwargs)
+
+        return call
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"Cannot set {name}, ThreadPoolDataManager is read-only")
+
+    def _thread_manager(self):
+        """
+        [For internal use only] Returns the manager of the calling thread, creating
+        it on first use.
+        """
+        manager = getattr(self._local, "manager", None)
+        if manager is None:
+            manager = self._local.manager = self._factory()
+        return manager
+
+    def _call(self, name: str, *args, **kwargs):
+        """
+        [For internal use only] Runs in a pool thread, calling the method of the
+        thread's manager.
+        """
+        return getattr(self._thread_manager(), name)(*args, **kwargs)
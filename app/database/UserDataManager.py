@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from botocore.exceptions import ClientError
 
 from ..models.Authentication import UserInDB
+from ..internal.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -15,21 +16,32 @@ logging.basicConfig(
 
 
 class UserDataManager:
-    def __init__(self, dyn_resource):
+    def __init__(
+        self,
+        dyn_resource,
+        user_cache: TTLCache[str, UserInDB | None] | None = None,
+    ):
         """
         : param dyn_resource: A Boto3 DynamoDB resource.
+        : param user_cache: Cache of users keyed by username (None values cache
+        missing users).
         """
         self.dyn_resource = dyn_resource
         self.user_table = None
+        self.user_cache = user_cache or TTLCache(maxsize=4096, ttl=60.0)
 
-    def load_user_table(self, user_table_name: str) -> bool:
+    def load_user_table(self, user_table_name: str, describe: bool = True) -> bool:
         """
         Loads the given user table, storing it as a member variable. Returns True if
         successful and false otherwise.
+
+        If describe is False, the table is bound without checking that it exists (no
+        DescribeTable round trip).
         """
         try:
             table = self.dyn_resource.Table(user_table_name)
-            table.load()
+            if describe:
+                table.load()
             exists = True
         except ClientError as err:
             if err.response["Error"]["Code"] == "ResourceNotFoundException":
@@ -57,11 +69,20 @@ class UserDataManager:
         login_attempts.
 
         Returns the user if found, and None otherwise.
+
+        Users are served from the user cache unless it is a login attempt. Writes
+        made through this manager invalidate the cache, writes made by other
+        processes are seen once the cached user expires.
         """
 
         if self.user_table is None:
             raise RuntimeError("User_Table not loaded!")
 
+        if not is_login_attempt:
+            found, cached = self.user_cache.lookup(username)
+            if found:
+                return cached
+
         try:
             response = self.user_table.get_item(Key={"username": username})
             user = response.get("Item")
@@ -74,7 +95,9 @@ class UserDataManager:
                 err.response["Error"]["Code"],
                 err.response["Error"]["Message"],
             )
-        return UserInDB(**user) if user is not None else None
+        user_in_db = UserInDB(**user) if user is not None else None
+        self.user_cache.set(username, user_in_db)
+        return user_in_db
 
     def register_user(self, user_data: dict, hashed_password: str, scopes: str) -> bool:
         """
@@ -114,6 +137,8 @@ class UserDataManager:
                 err.response["Error"]["Message"],
             )
             return False
+        finally:
+            self.user_cache.invalidate(user_data["username"])
 
         logger.info("Successfully registered user %s", user_data["username"])
         return True
@@ -147,4 +172,40 @@ class UserDataManager:
                 err.response["Error"]["Message"],
             )
             return False
+        finally:
+            self.user_cache.invalidate(username)
         return True
+
+    def set_user_disabled(self, username: str, disabled: bool) -> UserInDB | None:
+        """
+        Disables (or re-enables) an existing user in the database.
+
+        Returns the updated user, or None if the user was not found.
+
+        # Exceptions
+        Raises a RuntimeError if there is an issue with the AWS.
+        """
+        if self.user_table is None:
+            raise RuntimeError("User_Table not loaded!")
+
+        try:
+            response = self.user_table.update_item(
+                Key={"username": username},
+                ConditionExpression="attribute_exists(username)",
+                UpdateExpression="set disabled = :disabled",
+                ExpressionAttributeValues={":disabled": disabled},
+                ReturnValues="ALL_NEW",
+            )
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            logger.error(
+                "Couldn't update item in %s. Here's why: %s: %s",
+                self.user_table.name,
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise RuntimeError("Issue encountered with AWS DynamoDB") from err
+        finally:
+            self.user_cache.invalidate(username)
+        return UserInDB(**response["Attributes"])
@@ -1,10 +1,21 @@
-import boto3
+import asyncio
+import functools
+import logging
+from contextlib import suppress
 
 from .DeviceDataManager import DeviceDataManager
+from .DynamoDBSession import DynamoDBSession
+from .NotificationHub import NotificationHub
+from .TelemetryBuffer import TelemetryBuffer
+from .ThreadPoolManager import MeteredThreadPool, ThreadPoolDataManager
 from .UserDataManager import UserDataManager
 
+from ..internal.cache import TTLCache
+from ..internal.config import Settings
 from ..internal.credentials import AWS_credentials
 
+logger = logging.getLogger(__name__)
+
 
 class __Credentials:
     DB_REGION_NAME, DB_ACCESS_KEY_ID, DB_SECRET_ACCESS_KEY = AWS_credentials()
@@ -13,62 +24,86 @@ class __Credentials:
 class __DB_Connections:
     DeviceDB: DeviceDataManager | None = None
     UserDB: UserDataManager | None = None
+    # Managers used by the routers, see open_async_db
+    PooledDeviceDB: ThreadPoolDataManager[DeviceDataManager] | None = None
+    PooledUserDB: ThreadPoolDataManager[UserDataManager] | None = None
+    # Session shared by all managers
+    Session: DynamoDBSession | None = None
+    # Pool running the routers' database calls
+    ThreadPool: MeteredThreadPool | None = None
+    # Check of the tables' existence, when deferred (see Settings.DB_TABLE_CHECK)
+    TableCheck: asyncio.Task | None = None
+    # Write-behind buffer of device data (see Settings.TELEMETRY_WRITE_BEHIND)
+    Telemetry: TelemetryBuffer | None = None
 
 
-def __init_device_db(
-    device_table: str = "Device_Data",
-    order_table: str = "Master_Order",
-    history_table: str = "Master_History",
-    schedule_table: str = "Schedule_Data",
-    schedule_control: str = "Schedule_Control",
-    serial_table: str = "Serial_Number_Registration",
-) -> DeviceDataManager:
+class __Shared:
+    """
+    State shared by the managers of this process (one per thread), so that writes
+    through any of them notify waiters and update the caches of all.
+    """
+
+    notification_hub = NotificationHub()
+    history_cache = TTLCache(Settings.HISTORY_CACHE_SIZE, Settings.HISTORY_CACHE_TTL)
+    serial_cache = TTLCache(Settings.SERIAL_CACHE_SIZE, Settings.SERIAL_CACHE_TTL)
+    unregistered_serial_cache = TTLCache(
+        Settings.SERIAL_NEGATIVE_CACHE_SIZE, Settings.SERIAL_NEGATIVE_CACHE_TTL
+    )
+    user_cache = TTLCache(Settings.USER_CACHE_SIZE, Settings.USER_CACHE_TTL)
+
+
+__DEVICE_TABLES = (
+    "Device_Data",
+    "Master_Order",
+    "Master_History",
+    "Schedule_Data",
+    "Schedule_Control",
+    "Serial_Number_Registration",
+)
+__USER_TABLE = "User_Table"
+
+
+def __init_device_db(session: DynamoDBSession) -> DeviceDataManager:
     """
     Creates an instance of DeviceDataManager allowing access to the DynamoDB's table.
+    The tables are checked for existence on startup, see open_async_db.
     """
     db = DeviceDataManager(
-        boto3.resource(
-            "dynamodb",
-            region_name=__Credentials.DB_REGION_NAME,
-            aws_access_key_id=__Credentials.DB_ACCESS_KEY_ID,
-            aws_secret_access_key=__Credentials.DB_SECRET_ACCESS_KEY,
-        )
+        session.resource(),
+        notification_hub=__Shared.notification_hub,
+        history_cache=__Shared.history_cache,
+        serial_cache=__Shared.serial_cache,
+        unregistered_serial_cache=__Shared.unregistered_serial_cache,
     )
 
-    if not db.load_tables(
-        device_table,
-        order_table,
-        history_table,
-        schedule_table,
-        schedule_control,
-        serial_table,
-    ):
-        raise FileNotFoundError("One or more tables not found!")
+    db.load_tables(*__DEVICE_TABLES, describe=False)
     return db
 
 
-def __init_user_db(user_table: str = "User_Table"):
+def __init_user_db(session: DynamoDBSession) -> UserDataManager:
     """
     Creates an instance of UserDataManager allowing access to the DynamoDB's table.
+    The table is checked for existence on startup, see open_async_db.
     """
     db = UserDataManager(
-        boto3.resource(
-            "dynamodb",
-            region_name=__Credentials.DB_REGION_NAME,
-            aws_access_key_id=__Credentials.DB_ACCESS_KEY_ID,
-            aws_secret_access_key=__Credentials.DB_SECRET_ACCESS_KEY,
-        )
+        session.resource(),
+        user_cache=__Shared.user_cache,
     )
 
-    if not (db.load_user_table(user_table)):
-        raise FileNotFoundError("User Table not found!")
+    db.load_user_table(__USER_TABLE, describe=False)
     return db
 
 
 def _init_tables() -> None:
+    session = DynamoDBSession(
+        __Credentials.DB_REGION_NAME,
+        __Credentials.DB_ACCESS_KEY_ID,
+        __Credentials.DB_SECRET_ACCESS_KEY,
+    )
+    __DB_Connections.Session = session
     __DB_Connections.DeviceDB, __DB_Connections.UserDB = (
-        __init_device_db(),
-        __init_user_db(),
+        __init_device_db(session),
+        __init_user_db(session),
     )
 
     del __Credentials.DB_ACCESS_KEY_ID, __Credentials.DB_SECRET_ACCESS_KEY
@@ -77,17 +112,162 @@ def _init_tables() -> None:
 _init_tables()
 
 
-def get_device_db() -> DeviceDataManager:
+async def __check_tables(
+    device_db: ThreadPoolDataManager[DeviceDataManager],
+    user_db: ThreadPoolDataManager[UserDataManager],
+) -> None:
+    """
+    [For internal use only] Checks that all tables exist, describing each one
+    (DescribeTable) in its own pool call, concurrently.
+
+    # Exceptions
+    Raises a FileNotFoundError if one or more tables are not found.
+    """
+    *devices_found, user_found = await asyncio.gather(
+        *(device_db.table_exists(table) for table in __DEVICE_TABLES),
+        user_db.load_user_table(__USER_TABLE),
+    )
+    if not all(devices_found):
+        raise FileNotFoundError("One or more tables not found!")
+    if not user_found:
+        raise FileNotFoundError("User Table not found!")
+
+
+async def __check_tables_in_background(
+    device_db: ThreadPoolDataManager[DeviceDataManager],
+    user_db: ThreadPoolDataManager[UserDataManager],
+) -> None:
+    """
+    [For internal use only] Deferred __check_tables, logging missing tables.
+    """
+    try:
+        await __check_tables(device_db, user_db)
+    except Exception:
+        logger.exception("Couldn't check for existence of tables")
+
+
+async def open_async_db() -> None:
+    """
+    Opens the managers used by the routers: their (blocking) calls are awaited in a
+    pool of Settings.DB_THREADPOOL_SIZE threads, each with its own sync managers.
+
+    The tables are then checked for existence according to Settings.DB_TABLE_CHECK,
+    either before returning ("eager"), in a background task ("deferred") or not at
+    all ("skip"). The telemetry buffer is started if Settings.TELEMETRY_WRITE_BEHIND.
+
+    Must be awaited on startup (in the app's lifespan), from the event loop serving
+    the requests, and paired with close_async_db on shutdown.
+
+    # Exceptions
+    Raises a FileNotFoundError if one or more tables are not found (when "eager").
+    """
+    session = __DB_Connections.Session
+    assert session is not None, "Tables not initialized"
+    pool = MeteredThreadPool(Settings.DB_THREADPOOL_SIZE)
+    __DB_Connections.ThreadPool = pool
+    __DB_Connections.PooledDeviceDB = ThreadPoolDataManager(
+        functools.partial(__init_device_db, session), pool
+    )
+    __DB_Connections.PooledUserDB = ThreadPoolDataManager(
+        functools.partial(__init_user_db, session), pool
+    )
+
+    device_db, user_db = get_device_db(), get_user_db()
+    if Settings.DB_TABLE_CHECK == "eager":
+        try:
+            await __check_tables(device_db, user_db)
+        except BaseException:
+            await close_async_db()
+            raise
+    elif Settings.DB_TABLE_CHECK == "deferred":
+        __DB_Connections.TableCheck = asyncio.create_task(
+            __check_tables_in_background(device_db, user_db)
+        )
+
+    if Settings.TELEMETRY_WRITE_BEHIND:
+        telemetry = TelemetryBuffer(
+            device_db, Settings.TELEMETRY_QUEUE_SIZE, Settings.TELEMETRY_FLUSH_INTERVAL
+        )
+        telemetry.start()
+        __DB_Connections.Telemetry = telemetry
+
+
+async def close_async_db() -> None:
+    """
+    Closes the managers opened by open_async_db, after flushing the telemetry buffer.
+    """
+    telemetry, __DB_Connections.Telemetry = __DB_Connections.Telemetry, None
+    if telemetry is not None:
+        await telemetry.close()
+
+    pool, table_check = __DB_Connections.ThreadPool, __DB_Connections.TableCheck
+    __DB_Connections.PooledDeviceDB = __DB_Connections.PooledUserDB = None
+    __DB_Connections.ThreadPool = __DB_Connections.TableCheck = None
+    if table_check is not None:
+        table_check.cancel()
+        with suppress(asyncio.CancelledError):
+            await table_check
+    if pool is not None:
+        pool.shutdown()
+
+
+def get_db_stats() -> dict:
+    """
+    Returns the saturation of the thread pool running the routers' database calls
+    (None unless opened), the state of the telemetry buffer (in write-behind mode,
+    None otherwise) and the hit/miss counts of the caches.
+    """
+    pool, telemetry = __DB_Connections.ThreadPool, __DB_Connections.Telemetry
+    return {
+        "thread_pool": pool.stats() if pool is not None else None,
+        "telemetry_buffer": telemetry.stats() if telemetry is not None else None,
+        "caches": {
+            "history": __Shared.history_cache.stats(),
+            "serial": __Shared.serial_cache.stats(),
+            "unregistered_serial": __Shared.unregistered_serial_cache.stats(),
+            "user": __Shared.user_cache.stats(),
+        },
+    }
+
+
+def get_device_db() -> ThreadPoolDataManager[DeviceDataManager]:
+    """
+    Dependency Injector for the DeviceDataManager, with its calls run in the thread
+    pool (see open_async_db)
+    """
+    assert __DB_Connections.PooledDeviceDB is not None, "DeviceDB not opened"
+    return __DB_Connections.PooledDeviceDB
+
+
+def get_user_db() -> ThreadPoolDataManager[UserDataManager]:
+    """
+    Dependency Injector for the UserDataManager, with its calls run in the thread
+    pool (see open_async_db)
+    """
+    assert __DB_Connections.PooledUserDB is not None, "UserDB not opened"
+    return __DB_Connections.PooledUserDB
+
+
+def get_telemetry_buffer() -> TelemetryBuffer | None:
+    """
+    Dependency Injector for the TelemetryBuffer (None unless in write-behind mode)
+    """
+    return __DB_Connections.Telemetry
+
+
+def get_sync_device_db() -> DeviceDataManager:
     """
-    Dependency Injector for DeviceDataManager
+    Returns the (blocking) DeviceDataManager, for use outside of the event loop
+    (e.g. scripts and tests).
     """
     assert __DB_Connections.DeviceDB is not None, "DeviceDB not initialized"
     return __DB_Connections.DeviceDB
 
 
-def get_user_db() -> UserDataManager:
+def get_sync_user_db() -> UserDataManager:
     """
-    Dependency Injector for UserDataManager
+    Returns the (blocking) UserDataManager, for use outside of the event loop
+    (e.g. scripts and tests).
     """
     assert __DB_Connections.UserDB is not None, "UserDB not initialized"
     return __DB_Connections.UserDB
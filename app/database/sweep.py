@@ -0,0 +1,30 @@
+"""
+Removes the schedules that have ended from the Schedule Table, catching up on the
+items DynamoDB's TTL has not removed (yet), see
+DeviceDataManager.sweep_expired_schedules. The API does not run it, since it scans
+the whole table: run it from a single scheduled job (e.g. an hourly cron job on one
+host), from the repository root (requires the same credentials as the API):
+
+    python -m app.database.sweep
+"""
+
+import logging
+import sys
+
+from . import get_sync_device_db
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    try:
+        removed = get_sync_device_db().sweep_expired_schedules()
+    except RuntimeError:
+        logger.exception("Couldn't sweep expired schedules")
+        return 1
+    print(f"Removed {removed} expired schedule(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,12 @@
 # Authentication & Security
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import (
+    Depends,
+    HTTPException,
+    Security,
+    WebSocket,
+    WebSocketException,
+    status,
+)
 from fastapi.security import (
     OAuth2PasswordBearer,
     SecurityScopes,
@@ -7,10 +14,10 @@ from fastapi.security import (
 )
 import jwt
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
+from .passwords import password_hasher
 
 # Database & Data Validation
-from ..database import UserDataManager, get_user_db
+from ..database import ThreadPoolDataManager, UserDataManager, get_user_db
 from ..models.Authentication import Token, TokenData, User, UserInDB
 from pydantic import ValidationError
 
@@ -19,7 +26,11 @@ from .credentials import User_Auth_Credentials
 
 # Utilities
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, NamedTuple
+import hashlib
+import time
+from .cache import TTLCache
+from .config import Settings
 
 
 class __Auth_Config:
@@ -40,20 +51,33 @@ oauth2_scheme = OAuth2PasswordBearer(
     scopes=__Scopes,
 )
 
-__pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", truncate_error=True)
+
+class _VerifiedToken(NamedTuple):
+    claims: dict
+    token_data: TokenData
+    scopes: frozenset[str]
+
+
+# Tokens that passed verification, keyed by their digest and expiring with them
+_token_cache: TTLCache[bytes, _VerifiedToken] = TTLCache(
+    Settings.TOKEN_CACHE_SIZE, int(__Auth_Config.ACCESS_TOKEN_EXPIRE_MINUTES) * 60
+)
 
 
-def _verify_password_hash(plain_password: str, hashed_password: str) -> bool:
-    """Verify a hash using bcrypt."""
-    return __pwd_context.verify(plain_password, hashed_password)
+async def _verify_password_hash(plain_password: str, hashed_password: str) -> bool:
+    """Verify a hash using bcrypt (off the event loop, see PasswordHasher)."""
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
 def _verify_scopes(input_scopes: list[str], user_scopes: str) -> bool:
     return all(scope in user_scopes for scope in input_scopes)
 
 
-def authenticate_user(
-    name: str, input_password: str, input_scopes: list[str], db: UserDataManager
+async def authenticate_user(
+    name: str,
+    input_password: str,
+    input_scopes: list[str],
+    db: ThreadPoolDataManager[UserDataManager],
 ) -> UserInDB:
     """
     Check if user credentials are valid. Gets a username, password and optinal scopes
@@ -62,7 +86,7 @@ def authenticate_user(
     if not found.
     """
 
-    user = db.get_user(name, True)
+    user = await db.get_user(name, True)
 
     # TODO@[ZIYA]: Determine if this is the correct way to handle scopes
     # https://github.com/Kat-Lai-Technologies/Kat-Lai-Backend/issues/21
@@ -78,7 +102,7 @@ def authenticate_user(
 
     if (
         user is None
-        or not _verify_password_hash(input_password, user.hashed_password)
+        or not await _verify_password_hash(input_password, user.hashed_password)
         or not _verify_scopes(input_scopes, user.scopes)
     ):
         raise insufficent_permissions_err
@@ -86,8 +110,9 @@ def authenticate_user(
     return user
 
 
-def register_user_with_unhashed_password(
-    user_data: dict, user_db: Annotated[UserDataManager, Depends(get_user_db)]
+async def register_user_with_unhashed_password(
+    user_data: dict,
+    user_db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
 ) -> None:
     """
     Register a user in the database.
@@ -102,7 +127,7 @@ def register_user_with_unhashed_password(
     - scopes: A list of strings that contans the desired user scopes, may be empty list.
     -- If the user has the "Admin" scope, creates a user with all scopes.
     """
-    password_hash = _get_password_hash(user_data["unhashed_password"])
+    password_hash = await _get_password_hash(user_data["unhashed_password"])
     del user_data["unhashed_password"]
 
     try:
@@ -114,13 +139,13 @@ def register_user_with_unhashed_password(
             detail="Bad Request: Invalid Scopes",
         ) from err
 
-    if not (user_db.register_user(user_data, password_hash, validated_scopes)):
+    if not (await user_db.register_user(user_data, password_hash, validated_scopes)):
         raise RuntimeError("Failed to register user in database!")
 
 
-def _get_password_hash(plain_password: str) -> str:
-    """Hash a string using bcrypt."""
-    return __pwd_context.hash(plain_password)
+async def _get_password_hash(plain_password: str) -> str:
+    """Hash a string using bcrypt (off the event loop, see PasswordHasher)."""
+    return await password_hasher.hash(plain_password)
 
 
 def validate_scopes(input_scopes: list[str]) -> str:
@@ -151,10 +176,11 @@ def _create_access_token(data: dict, expires_delta: timedelta | None = None) ->
     return encoded_jwt
 
 
-def get_access_token(
-    form_data: OAuth2PasswordRequestForm, user_db: UserDataManager
+async def get_access_token(
+    form_data: OAuth2PasswordRequestForm,
+    user_db: ThreadPoolDataManager[UserDataManager],
 ) -> Token:
-    user = authenticate_user(
+    user = await authenticate_user(
         form_data.username, form_data.password, form_data.scopes, user_db
     )
 
@@ -173,11 +199,23 @@ def get_access_token(
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     security_scopes: SecurityScopes,
-    db: Annotated[UserDataManager, Depends(get_user_db)],
+    db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
 ) -> User:
     """
     Validate a user's token and return the user if the token is valid.
     """
+    return await _get_token_user(token, security_scopes, db)
+
+
+async def _get_token_user(
+    token: str,
+    security_scopes: SecurityScopes,
+    db: ThreadPoolDataManager[UserDataManager],
+) -> User:
+    """
+    Validate a token against the required scopes and return the user it belongs to.
+    Raises an HTTP 401 Exception if the token is invalid or lacks permissions.
+    """
     # Determine Authentication Type (Scoped or Not)
     if security_scopes.scopes:
         authenticate_value = f"Bearer scope={security_scopes.scope_str}"
@@ -191,43 +229,100 @@ async def get_current_user(
     )
 
     try:
-        assert __Auth_Config.SECRET_KEY is not None, "Secret Key not set!"
-        payload = jwt.decode(
-            token, __Auth_Config.SECRET_KEY, algorithms=[__Auth_Config.ALGORITHM]
-        )
-
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-
-        token_scopes = payload.get("scopes", [])
-        token_data = TokenData(username=username, scopes=token_scopes)
+        verified = _get_verified_token(token)
     except (InvalidTokenError, ValidationError, AssertionError) as err:
         raise credentials_exception from err
 
-    user = db.get_user(token_data.username, False)
+    user = await db.get_user(verified.token_data.username, False)
     if user is None:
         raise credentials_exception
 
     # Authenticate Scoped Permissions
     for scope in security_scopes.scopes:
-        if scope not in token_data.scopes:
+        if scope not in verified.scopes:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Not enough permissions",
                 headers={"WWW-Authenticate": authenticate_value},
             )
 
-    # Return Authenticated User
+    # Return Authenticated User, without validating the (already validated) fields of
+    # the cached user again
+    return User.model_construct(
+        **{field: getattr(user, field) for field in User.model_fields}
+    )
+
+
+def _get_verified_token(token: str) -> _VerifiedToken:
+    """
+    Returns the verified contents of a token, from the token cache if the same token
+    was verified before. Tokens are cached by digest until they expire, so repeated
+    requests skip the signature check and parsing.
+
+    # Exceptions
+    Raises an InvalidTokenError, ValidationError or AssertionError if the token is
+    invalid (see _verify_token).
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    verified = _token_cache.get(key)
+    if verified is None:
+        verified = _verify_token(token)
+        exp = verified.claims.get("exp")
+        if exp is not None:
+            _token_cache.set(key, verified, ttl=exp - time.time())
+    return verified
+
+
+def _verify_token(token: str) -> _VerifiedToken:
+    """
+    Decodes a token, verifying its signature and expiry, and parses its claims.
+
+    # Exceptions
+    Raises an InvalidTokenError if the token is invalid, expired or has no subject.
+    Raises a ValidationError if the claims are malformed.
+    Raises an AssertionError if the secret key is not set.
+    """
+    assert __Auth_Config.SECRET_KEY is not None, "Secret Key not set!"
+    payload = jwt.decode(
+        token, __Auth_Config.SECRET_KEY, algorithms=[__Auth_Config.ALGORITHM]
+    )
+
+    username: str = payload.get("sub")
+    if username is None:
+        raise InvalidTokenError("Token has no subject")
+
+    token_data = TokenData(username=username, scopes=payload.get("scopes", []))
+    return _VerifiedToken(payload, token_data, frozenset(token_data.scopes))
+
+
+async def get_current_websocket_user(
+    websocket: WebSocket,
+    security_scopes: SecurityScopes,
+    db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
+) -> User:
+    """
+    Validate the token of a WebSocket connection and return the user if the token
+    is valid and the user is active. The token is read from the Authorization
+    header ("Bearer <token>") or, for clients that cannot set headers, from the
+    token query parameter. Closes the connection (policy violation) otherwise.
+    """
+    scheme, _, token = websocket.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = websocket.query_params.get("token", "")
+
     try:
-        return User(**user.model_dump())
-    except ValidationError as err:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Invalid user data received from db in get_current_user(...)",
-            headers={"WWW-Authenticate": authenticate_value},
+        user = await _get_token_user(token, security_scopes, db)
+    except HTTPException as err:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason=str(err.detail)
         ) from err
 
+    if user.disabled:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Inactive user"
+        )
+    return user
+
 
 async def get_current_active_user(
     current_user: Annotated[User, Security(get_current_user)],
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generic, TypeVar
+
+from fastapi.encoders import jsonable_encoder
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+def payload_etag(payload: Any) -> str:
+    """
+    Returns a (strong) ETag for a response payload, a hash of its JSON encoding.
+    Derived from the data itself, it is the same across workers and instances.
+    """
+    encoded = json.dumps(
+        jsonable_encoder(payload), sort_keys=True, separators=(",", ":")
+    )
+    return f'"{hashlib.sha256(encoded.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks whether the ETag matches an If-None-Match header, using the weak
+    comparison that If-None-Match requires (i.e. ignoring the W/ prefix).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Thread-safe in-memory cache holding at most maxsize entries, evicting the least
+    recently used entry when full. Entries expire ttl seconds after being set. A
+    maxsize or ttl of 0 disables the cache. Counts hits and misses for monitoring.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def lookup(self, key: K) -> tuple[bool, V | None]:
+        """
+        Returns a tuple of whether the key was found (and not expired), and its value
+        (None if not found). Unlike get, distinguishes cached None values.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        """
+        Returns the value cached for the key, or default if not found.
+        """
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Caches the value for the key, for ttl seconds if given, otherwise for the
+        cache's ttl.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        """
+        Removes the key from the cache (if cached).
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the number of hits, misses and entries of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
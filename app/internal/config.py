@@ -0,0 +1,112 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    "Read an integer setting from the environment, falling back to the default."
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError as err:
+        raise ValueError(f"Invalid value for {name}, expected an integer") from err
+
+
+def _env_float(name: str, default: float) -> float:
+    "Read a float setting from the environment, falling back to the default."
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError as err:
+        raise ValueError(f"Invalid value for {name}, expected a number") from err
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    "Read a boolean (true/false, 1/0, yes/no) setting from the environment."
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(f"Invalid value for {name}, expected true or false")
+
+
+def _env_choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    "Read a setting from the environment, which must be one of the given choices."
+    value = os.environ.get(name, default)
+    if value not in choices:
+        raise ValueError(f"Invalid value for {name}, expected one of {choices}")
+    return value
+
+
+class Settings:
+    """
+    ### Description
+    Tunable (non-secret) settings of the API. Each setting can be overridden by an
+    environment variable of the same name, set before the server is started.
+
+    ### Exceptions
+    ValueError: If an environment variable has an invalid value.
+    """
+
+    # Write-through cache of the Master History Table, a size or TTL (in seconds)
+    # of 0 disables the cache
+    HISTORY_CACHE_SIZE = _env_int("HISTORY_CACHE_SIZE", 4096)
+    HISTORY_CACHE_TTL = _env_float("HISTORY_CACHE_TTL", 30.0)
+
+    # Serial number registration caches (see DeviceDataManager.is_serial_registered),
+    # active serial numbers are cached for SERIAL_CACHE_TTL seconds, inactive or
+    # unknown ones for SERIAL_NEGATIVE_CACHE_TTL seconds
+    SERIAL_CACHE_SIZE = _env_int("SERIAL_CACHE_SIZE", 16384)
+    SERIAL_CACHE_TTL = _env_float("SERIAL_CACHE_TTL", 3600.0)
+    SERIAL_NEGATIVE_CACHE_SIZE = _env_int("SERIAL_NEGATIVE_CACHE_SIZE", 4096)
+    SERIAL_NEGATIVE_CACHE_TTL = _env_float("SERIAL_NEGATIVE_CACHE_TTL", 10.0)
+
+    # Cache of users read on every authenticated request (see UserDataManager)
+    USER_CACHE_SIZE = _env_int("USER_CACHE_SIZE", 4096)
+    USER_CACHE_TTL = _env_float("USER_CACHE_TTL", 60.0)
+
+    # Cache of verified access tokens, entries expire with the token
+    TOKEN_CACHE_SIZE = _env_int("TOKEN_CACHE_SIZE", 8192)
+
+    # Worker processes used for bcrypt hashing/verification, and the maximum number
+    # of operations submitted to them at once (further logins wait for a slot)
+    PASSWORD_HASH_WORKERS = _env_int(
+        "PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)
+    )
+    PASSWORD_HASH_CONCURRENCY = _env_int(
+        "PASSWORD_HASH_CONCURRENCY", 2 * PASSWORD_HASH_WORKERS
+    )
+
+    # Threads running the routers' (blocking) database calls, off the event loop
+    DB_THREADPOOL_SIZE = _env_int("DB_THREADPOOL_SIZE", 10)
+
+    # Write-behind of device data (/device/put-device answers 202 once queued),
+    # flushed every TELEMETRY_FLUSH_INTERVAL seconds or 25 items. Requests wait up
+    # to TELEMETRY_ENQUEUE_TIMEOUT seconds for a slot when the queue is full (503)
+    TELEMETRY_WRITE_BEHIND = _env_bool("TELEMETRY_WRITE_BEHIND", False)
+    TELEMETRY_QUEUE_SIZE = _env_int("TELEMETRY_QUEUE_SIZE", 10000)
+    TELEMETRY_FLUSH_INTERVAL = _env_float("TELEMETRY_FLUSH_INTERVAL", 1.0)
+    TELEMETRY_ENQUEUE_TIMEOUT = _env_float("TELEMETRY_ENQUEUE_TIMEOUT", 0.5)
+
+    # When the tables' existence is checked (DescribeTable) on startup, either
+    # "eager" (before serving requests), "deferred" (in the background) or "skip"
+    DB_TABLE_CHECK = _env_choice(
+        "DB_TABLE_CHECK", "eager", ("eager", "deferred", "skip")
+    )
+
+    # Revalidation of the iSuke credentials (in seconds), every ISUKE_PROBE_INTERVAL
+    # while valid and ISUKE_PROBE_RETRY_INTERVAL while not (Health API disabled)
+    ISUKE_PROBE_INTERVAL = _env_float("ISUKE_PROBE_INTERVAL", 300.0)
+    ISUKE_PROBE_RETRY_INTERVAL = _env_float("ISUKE_PROBE_RETRY_INTERVAL", 30.0)
+    ISUKE_PROBE_TIMEOUT = _env_float("ISUKE_PROBE_TIMEOUT", 5.0)
+
+    # DynamoDB connections (see DynamoDBSession), timeouts are in seconds. Each
+    # thread has its own client, making one call at a time: AWS_MAX_POOL_CONNECTIONS
+    # is per thread, up to DB_THREADPOOL_SIZE times as many being opened in total
+    AWS_MAX_POOL_CONNECTIONS = _env_int("AWS_MAX_POOL_CONNECTIONS", 2)
+    AWS_TCP_KEEPALIVE = _env_bool("AWS_TCP_KEEPALIVE", True)
+    AWS_CONNECT_TIMEOUT = _env_float("AWS_CONNECT_TIMEOUT", 2.0)
+    AWS_READ_TIMEOUT = _env_float("AWS_READ_TIMEOUT", 5.0)
+    AWS_RETRY_MODE = _env_choice(
+        "AWS_RETRY_MODE", "adaptive", ("legacy", "standard", "adaptive")
+    )
+    AWS_MAX_ATTEMPTS = _env_int("AWS_MAX_ATTEMPTS", 5)
@@ -0,0 +1,31 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(key: dict[str, str]) -> str:
+    """
+    Encodes the last evaluated key of a DynamoDB query (with string attributes) as
+    an opaque, URL-safe continuation cursor.
+    """
+    data = json.dumps(key, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, str]:
+    """
+    Decodes a cursor returned by encode_cursor into the key to resume the query at.
+
+    # Exceptions
+    Raises a ValueError if the cursor is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as err:
+        raise ValueError("Invalid cursor") from err
+    if not isinstance(key, dict) or not all(
+        isinstance(name, str) and isinstance(value, str) for name, value in key.items()
+    ):
+        raise ValueError("Invalid cursor")
+    return key
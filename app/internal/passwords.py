@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+from .config import Settings
+
+# NOTE: Imported by the worker processes, keep free of database/credential imports
+__pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", truncate_error=True)
+
+
+def hash_password(plain_password: str) -> str:
+    """Hash a string using bcrypt."""
+    return __pwd_context.hash(plain_password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a hash using bcrypt."""
+    return __pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a pool of worker processes, so that
+    they neither block the event loop nor compete for a single core.
+
+    At most max_concurrency operations are submitted to the pool at once, further
+    callers wait (without blocking the event loop) for a slot. The pool is started
+    on first use, and uses spawned (not forked) workers since the server process
+    runs threads.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._pool: ProcessPoolExecutor | None = None
+        # asyncio primitives are bound to a single event loop
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def hash(self, plain_password: str) -> str:
+        """
+        Hashes a password using bcrypt, in a worker process.
+        """
+        return await self._run(hash_password, plain_password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verifies a password against a bcrypt hash, in a worker process.
+        """
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes (if started), they are restarted on next use.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, func, *args):
+        """
+        [For internal use only] Runs a function in the pool once a slot is free.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return await loop.run_in_executor(self._pool, func, *args)
+
+
+password_hasher = PasswordHasher(
+    Settings.PASSWORD_HASH_WORKERS, Settings.PASSWORD_HASH_CONCURRENCY
+)
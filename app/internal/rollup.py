@@ -0,0 +1,179 @@
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Literal
+
+import numpy as np
+
+from ..models.Device import DeviceData
+
+Bucket = Literal["hour", "day", "week"]
+
+# Length of each bucket in seconds
+BUCKET_SECONDS: dict[Bucket, int] = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+# Buckets are aligned on the epoch, shifted to a Monday (1970-01-05) for weeks
+_BUCKET_ORIGIN: dict[Bucket, int] = {"hour": 0, "day": 0, "week": 4 * 86400}
+
+
+class DeviceHistoryColumns:
+    """
+    Device history stored column-wise in NumPy arrays (sorted by time), built from
+    DeviceData items. Items whose Local_Time_Str is not an ISO 8601 date and time
+    are skipped (and counted).
+    """
+
+    def __init__(self, items: Iterable[DeviceData] = ()):
+        self._times: list[datetime] = []
+        self._temperature: list[float] = []
+        self._humidity: list[float] = []
+        self._wind_speed: list[float] = []
+        self._element: list[str] = []
+        self._intensity: list[float] = []
+        self.skipped = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def append(self, item: DeviceData) -> None:
+        """
+        Adds an item to the columns.
+        """
+        try:
+            # Local time of the device, the UTC offset (if any) is ignored
+            local_time = datetime.fromisoformat(item.Local_Time_Str)
+        except ValueError:
+            self.skipped += 1
+            return
+        self._times.append(local_time.replace(tzinfo=None))
+        self._temperature.append(float(item.temperature))
+        self._humidity.append(float(item.humidity))
+        self._wind_speed.append(float(item.wind_speed))
+        self._element.append((item.state.element or "").title())
+        intensity = item.state.intensity
+        self._intensity.append(np.nan if intensity is None else intensity)
+
+    def extend(self, items: Iterable[DeviceData]) -> None:
+        """
+        Adds items (e.g. a page of device history) to the columns.
+        """
+        for item in items:
+            self.append(item)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """
+        Returns the columns as arrays, sorted by time (in seconds since the epoch,
+        of the devices' local time).
+        """
+        times = np.array(self._times, dtype="datetime64[s]").astype(np.int64)
+        order = np.argsort(times, kind="stable")
+        return {
+            "time": times[order],
+            "temperature": np.array(self._temperature, dtype=np.float64)[order],
+            "humidity": np.array(self._humidity, dtype=np.float64)[order],
+            "wind_speed": np.array(self._wind_speed, dtype=np.float64)[order],
+            "element": np.array(self._element, dtype=str)[order],
+            "intensity": np.array(self._intensity, dtype=np.float64)[order],
+        }
+
+
+def _to_list(values: np.ndarray) -> list[float | None]:
+    """
+    [For internal use only] Converts an array to a list, NaN becoming None.
+    """
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def rollup(
+    columns: DeviceHistoryColumns, bucket: Bucket, max_gap: float
+) -> dict[str, object]:
+    """
+    Aggregates device history into buckets of an hour, day or week (of local time).
+    Each item is taken to last until the next one, at most max_gap seconds (longer
+    gaps are the device being offline), the last item lasting 0 seconds.
+
+    Returns, for each bucket with samples (or spanned by an item): its start, number
+    of samples, the mean/min/max of temperature, humidity and wind_speed, the mean
+    intensity and time (in seconds) spent in each element, and the duty cycle
+    (fraction of the bucket during which the intensity was above 0). Items lasting
+    past the end of their bucket count in each bucket for the part within it.
+    """
+    data = columns.arrays()
+    times = data["time"]
+    size, origin = BUCKET_SECONDS[bucket], _BUCKET_ORIGIN[bucket]
+    sample_buckets = (times - origin) // size * size + origin
+
+    # Items lasting past the end of their bucket are split across the buckets they
+    # span, each getting the part within it
+    durations = np.minimum(np.diff(times, append=times[-1:]), max_gap).astype(float)
+    ends = times + durations
+    spans = np.maximum(np.ceil((ends - sample_buckets) / size), 1).astype(np.int64)
+    item = np.repeat(np.arange(len(times)), spans)
+    offsets = np.arange(len(item)) - np.repeat(np.cumsum(spans) - spans, spans)
+    piece_buckets = sample_buckets[item] + offsets * size
+    piece_durations = np.minimum(ends[item], piece_buckets + size)
+    piece_durations -= np.maximum(times[item], piece_buckets)
+
+    # Buckets without samples may still be spanned by an item
+    bucket_starts = np.union1d(sample_buckets, piece_buckets)
+    bucket_index = np.searchsorted(bucket_starts, sample_buckets)
+    piece_index = np.searchsorted(bucket_starts, piece_buckets)
+    n_buckets = len(bucket_starts)
+    counts = np.bincount(bucket_index, minlength=n_buckets)
+    # Items are sorted by time, so each bucket's samples are a contiguous run
+    starts = np.flatnonzero(np.diff(bucket_index, prepend=np.int64(-1)) != 0)
+    sampled = counts > 0
+
+    def stats(values: np.ndarray) -> dict[str, list[float | None]]:
+        mean, low, high = np.full((3, n_buckets), np.nan)
+        if len(values):
+            mean[sampled] = np.add.reduceat(values, starts) / counts[sampled]
+            low[sampled] = np.minimum.reduceat(values, starts)
+            high[sampled] = np.maximum.reduceat(values, starts)
+        return {"mean": _to_list(mean), "min": _to_list(low), "max": _to_list(high)}
+
+    elements, element_index = np.unique(data["element"], return_inverse=True)
+    n_elements = len(elements)
+    cell = bucket_index * n_elements + element_index
+    cells = n_buckets * n_elements
+
+    intensity = data["intensity"]
+    has_intensity = ~np.isnan(intensity)
+    intensity_sum = np.bincount(
+        cell[has_intensity], weights=intensity[has_intensity], minlength=cells
+    ).reshape(n_buckets, n_elements)
+    intensity_count = np.bincount(cell[has_intensity], minlength=cells).reshape(
+        n_buckets, n_elements
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        intensity_mean = intensity_sum / intensity_count
+    time_in_element = np.bincount(
+        piece_index * n_elements + element_index[item],
+        weights=piece_durations,
+        minlength=cells,
+    ).reshape(n_buckets, n_elements)
+
+    active = has_intensity & (np.nan_to_num(intensity) > 0)
+    active_time = np.bincount(
+        piece_index, weights=piece_durations * active[item], minlength=n_buckets
+    )
+
+    return {
+        "bucket_start": np.datetime_as_string(
+            bucket_starts.astype("datetime64[s]")
+        ).tolist(),
+        "samples": counts.tolist(),
+        "temperature": stats(data["temperature"]),
+        "humidity": stats(data["humidity"]),
+        "wind_speed": stats(data["wind_speed"]),
+        "intensity_by_element": {
+            str(element): _to_list(intensity_mean[:, i])
+            for i, element in enumerate(elements)
+            if element
+        },
+        "time_in_element": {
+            str(element): time_in_element[:, i].tolist()
+            for i, element in enumerate(elements)
+            if element
+        },
+        "duty_cycle": (active_time / size).tolist(),
+    }
@@ -4,22 +4,54 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 
 # Utilities
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from typing import Annotated
-from .internal.Debug.utils import print_warn
 
 # Authentication
-from .database import UserDataManager, get_user_db
+from .database import (
+    ThreadPoolDataManager,
+    UserDataManager,
+    close_async_db,
+    get_user_db,
+    open_async_db,
+)
 from .models.Authentication import Token, User
 from .internal.Authentication import (
     get_access_token,
     get_current_active_user,
     register_user_with_unhashed_password,
 )
+from .internal.config import Settings
+from .internal.passwords import password_hasher
 
 # Routers
 from .routers import device_setup
 from .routers import device, health, manager, mobile
-from .sleepAPI.real_time import iSuke_creds_valid
+from .sleepAPI.real_time import monitor_iSuke_API
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Validates the iSuke credentials in the background, the Health API is disabled
+    # until they are (startup does not wait for the iSuke API)
+    iSuke_monitor = asyncio.create_task(
+        monitor_iSuke_API(
+            Settings.ISUKE_PROBE_INTERVAL,
+            Settings.ISUKE_PROBE_RETRY_INTERVAL,
+            Settings.ISUKE_PROBE_TIMEOUT,
+        )
+    )
+    try:
+        await open_async_db()
+        yield
+    finally:
+        iSuke_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await iSuke_monitor
+    await close_async_db()
+    # Stop the password hashing workers
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -27,16 +59,16 @@ app = FastAPI(
     summary="API for to manage AromaPod's and Aid in Sleep Studies",
     version="0.1.5",
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 
 app.include_router(mobile.router)
 app.include_router(device.router)
+app.include_router(device.websocket_router)
 app.include_router(manager.router)
-if iSuke_creds_valid:
-    app.include_router(health.router)
-else:
-    print_warn("iSuke Credentials are invalid! Health API Disabled!")
+# Disabled (503) while the iSuke credentials are not valid, see lifespan
+app.include_router(health.router)
 app.include_router(device_setup.router)
 
 
@@ -61,9 +93,9 @@ app.add_middleware(
 @app.post("/token", tags=["Authentication"], response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    user_db: Annotated[UserDataManager, Depends(get_user_db)],
+    user_db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
 ) -> Token:
-    return get_access_token(form_data, user_db)
+    return await get_access_token(form_data, user_db)
 
 
 # All Endpoints
@@ -83,17 +115,17 @@ async def read_users_me(
 )
 async def register_user(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    user_db: Annotated[UserDataManager, Depends(get_user_db)],
+    user_db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
     email: Annotated[str | None, Form()] = None,
     full_name: Annotated[str | None, Form()] = None,
 ) -> User:
-    user = user_db.get_user(form_data.username, True)
+    user = await user_db.get_user(form_data.username, True)
     if user is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken!"
         )
 
-    register_user_with_unhashed_password(
+    await register_user_with_unhashed_password(
         {
             "username": form_data.username,
             "email": email,
@@ -114,8 +146,8 @@ async def register_user(
 
 
 @app.delete("/users/delete", tags=["Authentication"], response_model=User)
-def delete_user(
-    user_db: Annotated[UserDataManager, Depends(get_user_db)],
+async def delete_user(
+    user_db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
     current_user: Annotated[
         User, Security(get_current_active_user, scopes=["User-Manager"])
     ],
@@ -126,7 +158,7 @@ def delete_user(
     if username is None:
         username = current_user.username
 
-    if user_db.delete_user(username):
+    if await user_db.delete_user(username):
         raise HTTPException(
             status_code=status.HTTP_200_OK, detail="User deleted successfully!"
         )
@@ -135,3 +167,32 @@ def delete_user(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete user!",
         )
+
+
+@app.put(
+    "/users/disable",
+    tags=["Authentication"],
+    response_model=User,
+    dependencies=[Security(get_current_active_user, scopes=["User-Manager"])],
+)
+async def disable_user(
+    user_db: Annotated[ThreadPoolDataManager[UserDataManager], Depends(get_user_db)],
+    username: str,
+    disabled: bool = True,
+) -> User:
+    """
+    Disables a user (or re-enables them if disabled is False), disabled users can no
+    longer access the API with their existing tokens.
+    """
+    try:
+        user = await user_db.set_user_disabled(username, disabled)
+    except RuntimeError as err:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update user!",
+        ) from err
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found!"
+        )
+    return User(**user.model_dump())
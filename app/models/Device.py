@@ -1,12 +1,14 @@
 # Models and Data
-from pydantic import BaseModel, model_validator, field_serializer
+from pydantic import BaseModel, Field, model_validator, field_serializer
 from .SerialNumber import Serial_Number as SerialNumberModel
 from . import Available_Elements
 
 # Utilities
-from datetime import datetime, timezone, timedelta
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
+from typing import Annotated, Literal
 from typing_extensions import Self
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 class DeviceParamters(BaseModel):
@@ -44,10 +46,46 @@ class MasterData(ClientData):
     user_touch_allowed: bool
 
 
+class ScheduleRecurrence(BaseModel):
+    frequency: Literal["daily", "weekly"]
+    # Number of occurrences, or time after which no occurrence starts
+    count: int | None = Field(default=None, ge=1)
+    until: datetime | None = None
+    # IANA timezone keeping the occurrences' wall clock time (e.g. across DST)
+    timezone: str = "UTC"
+
+    @model_validator(mode="after")
+    def validate_recurrence(self) -> Self:
+        if (self.count is None) == (self.until is None):
+            raise ValueError("Exactly one of count and until must be given")
+        if self.until is not None and not self.until.tzinfo:
+            raise ValueError("Until not in valid ISO8601 with timezone format")
+        try:
+            ZoneInfo(self.timezone)
+        except (ZoneInfoNotFoundError, ValueError) as err:
+            raise ValueError(
+                f"Timezone {self.timezone} is not a valid timezone"
+            ) from err
+        return self
+
+    @property
+    def period(self) -> timedelta:
+        """
+        Wall clock time between two occurrences.
+        """
+        return timedelta(days=1 if self.frequency == "daily" else 7)
+
+    @field_serializer("until")
+    def serialize_until(self, until_dt: datetime | None) -> str | None:
+        return until_dt.isoformat() if until_dt is not None else None
+
+
 class ScheduleData(BaseModel):
     start_time: datetime  # Sort Key
     end_time: datetime
     scheduled_paramters: DeviceParamters
+    # Repeats the schedule (start and end time being its first occurrence)
+    recurrence: ScheduleRecurrence | None = None
 
     @model_validator(mode="after")
     def validate_schedule_data(self) -> Self:
@@ -55,7 +93,12 @@ class ScheduleData(BaseModel):
             raise ValueError("Inputs not in valid ISO8601 with timezone format")
         if self.start_time >= self.end_time:
             raise ValueError("Start time cannot be the same as or after end time")
-        if self.end_time < (datetime.now(timezone.utc) - timedelta(minutes=5)):
+        if self.recurrence is not None:
+            if self.end_time - self.start_time >= self.recurrence.period:
+                raise ValueError("Occurrences of the schedule cannot overlap")
+            if self.last_occurrence() < 0:
+                raise ValueError("Until cannot be before the start time")
+        if self.series_end() < (datetime.now(UTC) - timedelta(minutes=5)):
             raise ValueError(
                 "End time cannot be in the past, please provide a future start time"
             )
@@ -69,6 +112,113 @@ class ScheduleData(BaseModel):
     def serialize_end_time(self, end_dt: datetime) -> str:
         return end_dt.isoformat()
 
+    def occurrence(self, index: int) -> tuple[datetime, datetime]:
+        """
+        Returns the start and end time of an occurrence (counted from 0) of the
+        schedule. Occurrences keep the wall clock time (in the recurrence's
+        timezone) of the first one, and its duration.
+        """
+        if self.recurrence is None:
+            return self.start_time, self.end_time
+        local_start = self.start_time.astimezone(ZoneInfo(self.recurrence.timezone))
+        start = (local_start + index * self.recurrence.period).astimezone(UTC)
+        return start, start + (self.end_time - self.start_time)
+
+    def last_occurrence(self) -> int:
+        """
+        Returns the index of the last occurrence of the schedule (-1 if none).
+        """
+        if self.recurrence is None:
+            return 0
+        if self.recurrence.count is not None:
+            return self.recurrence.count - 1
+        until = self.recurrence.until
+        assert until is not None
+        # Estimate, off by one at most around DST changes
+        index = max((until - self.start_time) // self.recurrence.period, -1)
+        while index >= 0 and self.occurrence(index)[0] > until:
+            index -= 1
+        while self.occurrence(index + 1)[0] <= until:
+            index += 1
+        return index
+
+    def series_end(self) -> datetime:
+        """
+        Returns the end time of the last occurrence of the schedule.
+        """
+        return self.occurrence(self.last_occurrence())[1]
+
+    def next_occurrence(self, now: datetime) -> int | None:
+        """
+        Returns the index of the first occurrence of the schedule that has not
+        ended at the given time (None if all have ended).
+        """
+        if self.recurrence is None:
+            return 0 if self.end_time >= now else None
+        index = max((now - self.end_time) // self.recurrence.period, 0)
+        while index > 0 and self.occurrence(index - 1)[1] >= now:
+            index -= 1
+        while self.occurrence(index)[1] < now:
+            index += 1
+        return index if index <= self.last_occurrence() else None
+
+    def find_occurrence(self, start_time: datetime) -> int | None:
+        """
+        Returns the index of the occurrence of the schedule starting at the given
+        time (None if none does).
+        """
+        if self.recurrence is None:
+            return 0 if self.start_time == start_time else None
+        estimate = round((start_time - self.start_time) / self.recurrence.period)
+        for index in (estimate - 1, estimate, estimate + 1):
+            if 0 <= index <= self.last_occurrence() and (
+                self.occurrence(index)[0] == start_time
+            ):
+                return index
+        return None
+
+    def overlaps(self, other: Self, now: datetime) -> bool:
+        """
+        Checks whether an occurrence of the schedule overlaps with one of the other
+        schedule's (their start and end included), ignoring the ones that have
+        ended at the given time. Goes from one occurrence to the next one of the
+        other schedule that could overlap, without expanding the others.
+        """
+        index = self.next_occurrence(max(now, other.start_time))
+        while index is not None:
+            start, end = self.occurrence(index)
+            other_index = other.next_occurrence(max(now, start))
+            if other_index is None:
+                return False
+            other_start = other.occurrence(other_index)[0]
+            # Refer to https://stackoverflow.com/questions/143552/comparing-date-ranges/143568#143568
+            if other_start <= end:
+                return True
+            index = self.next_occurrence(other_start)
+        return False
+
+    def remaining(self, now: datetime) -> Self | None:
+        """
+        Returns the schedule starting from its first occurrence that has not ended
+        at the given time (None if all have ended), its later occurrences being
+        expanded lazily.
+        """
+        index = self.next_occurrence(now)
+        if index is None:
+            return None
+        if index == 0:
+            return self
+        start, end = self.occurrence(index)
+        recurrence = self.recurrence
+        assert recurrence is not None
+        if recurrence.count is not None:
+            recurrence = recurrence.model_copy(
+                update={"count": recurrence.count - index}
+            )
+        return self.model_copy(
+            update={"start_time": start, "end_time": end, "recurrence": recurrence}
+        )
+
 
 class ControlData(Device):
     master_data: MasterData | None = None
@@ -107,3 +257,63 @@ class DeviceData(Device):
     @field_serializer("humidity", when_used="json")
     def serialize_humidity(self, humidity: Decimal) -> str:
         return str(humidity)
+
+
+# Result of a batch of device data (/device/put-device-batch), per item
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    detail: str | None = None
+
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[BatchItemResult]
+
+
+# Device history aggregated per bucket (/manager/device-history/rollup), each list
+# holds one value per bucket
+class RollupStats(BaseModel):
+    mean: list[float | None]
+    min: list[float | None]
+    max: list[float | None]
+
+
+class DeviceHistoryRollup(BaseModel):
+    bucket: Literal["hour", "day", "week"]
+    bucket_start: list[str]
+    samples: list[int]
+    temperature: RollupStats
+    humidity: RollupStats
+    wind_speed: RollupStats
+    intensity_by_element: dict[str, list[float | None]]
+    time_in_element: dict[str, list[float]]  # In seconds
+    duty_cycle: list[float]
+    skipped: int  # Items without a valid Local_Time_Str
+
+
+# Frames exchanged with devices over the control WebSocket (/device/ws)
+class InterruptFrame(BaseModel):
+    type: Literal["interrupt"]
+    data: DeviceParamters
+
+
+class TelemetryFrame(BaseModel):
+    type: Literal["telemetry"]
+    data: DeviceData
+
+
+class RefreshFrame(BaseModel):
+    type: Literal["refresh"]
+
+
+DeviceFrame = Annotated[
+    InterruptFrame | TelemetryFrame | RefreshFrame, Field(discriminator="type")
+]
+
+
+class ServerFrame(BaseModel):
+    type: Literal["control", "ack", "error"]
+    data: ControlData | None = None
+    detail: str | None = None
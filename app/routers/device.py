@@ -1,17 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Security, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    Security,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from pydantic import TypeAdapter, ValidationError
 
 # Authentication
-from ..internal.Authentication import get_current_active_user
+from ..internal.Authentication import (
+    get_current_active_user,
+    get_current_websocket_user,
+)
 
-from ..database import DeviceDataManager, get_device_db
-from ..models.Device import ControlData, DeviceData, DeviceParamters
+from ..database import (
+    DeviceDataManager,
+    TelemetryBuffer,
+    ThreadPoolDataManager,
+    get_device_db,
+    get_telemetry_buffer,
+)
+from ..internal.config import Settings
+from ..database.NotificationHub import NotificationHub
+from ..models.Device import (
+    BatchItemResult,
+    BatchResult,
+    ControlData,
+    DeviceData,
+    DeviceFrame,
+    DeviceParamters,
+    InterruptFrame,
+    ServerFrame,
+    TelemetryFrame,
+)
 from ..models.SerialNumber import Serial_Number
 
 # Timezone Utilities
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from typing import Annotated
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Annotated, Any
+
+# Longest time (in seconds) a fetch-control request may wait for new control data
+MAX_WAIT_SECONDS = 30
+# Most device data items accepted by a single put-device-batch request
+MAX_BATCH_ITEMS = 500
 
 
 router = APIRouter(
@@ -21,16 +63,37 @@ router = APIRouter(
     dependencies=[Security(get_current_active_user, scopes=["Device"])],
 )
 
+# WebSockets can't be authenticated by the OAuth2 scheme used by router above
+websocket_router = APIRouter(
+    prefix="/device",
+    tags=["Device"],
+    dependencies=[Security(get_current_websocket_user, scopes=["Device"])],
+)
+
+logger = logging.getLogger(__name__)
+
+_device_frame_adapter: TypeAdapter[DeviceFrame] = TypeAdapter(DeviceFrame)
+_device_data_adapter: TypeAdapter[DeviceData] = TypeAdapter(DeviceData)
+_device_data_list_adapter: TypeAdapter[list[DeviceData]] = TypeAdapter(list[DeviceData])
+
 
 @router.post("/fetch-control", response_model=ControlData)
 async def fetch_control(
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
     response: Response,
     serial: Serial_Number,
     refresh: bool,
     device_update: DeviceParamters | None = None,
     timezone_id: str = "Asia/Hong_Kong",  # TODO: Add documentation for timezone_id
+    wait_seconds: Annotated[float, Query(ge=0, le=MAX_WAIT_SECONDS)] = 0,
 ) -> ControlData:
+    """
+    Fetches (and consumes) the pending master order and schedule for a device.
+
+    If wait_seconds is given and nothing is pending, the request is held open
+    (long-polling) for up to wait_seconds, and returns as soon as a master order
+    or schedule is placed for the device.
+    """
     # TODO: Attempt to offload validation to Pydantic
 
     # Obtain Device Timezone to return local time for device
@@ -49,45 +112,39 @@ async def fetch_control(
     """
     control_info = ""
     if refresh:
-        db._refresh_schedule_control(serial)
         control_info += "Refreshed."
     if device_update is not None:
-        db.handle_interrupt_signal(serial, device_update)
+        await db.handle_interrupt_signal(serial, device_update)
         control_info += "Interrupted."
     if not control_info:
         control_info = "Not Interrupted or Refreshed."
 
-    master_order, schedule_order = None, None
-    # Fetch Master Control
+    # Fetch and consume Master & Schedule Control (single read and write)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait_seconds
+    version = db.notification_hub.version(serial, NotificationHub.CONTROL)
     try:
-        master_order = db.get_master_data(serial, "Order")
+        master_order, schedule_order = await db.fetch_control_bundle(serial, refresh)
+        # Long-poll, wait for control data to be placed before fetching again
+        while master_order is None and schedule_order is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            new_version = await db.notification_hub.wait(
+                serial, NotificationHub.CONTROL, version, remaining
+            )
+            if new_version == version:
+                break
+            version = new_version
+            master_order, schedule_order = await db.fetch_control_bundle(serial)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal Server Error: Unable to fetch master data",
+            detail="Internal Server Error: Unable to fetch control data",
         ) from err
-    if master_order is not None:
-        try:
-            db.serve_order(serial, master_order)
-        except ValueError as err:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Internal Server Error: Unable to serve master order",
-            ) from err
-
-    # Fetch Schedule Control asynchronously [TODO@Ziya]
-    try:
-        schedule_order = db.get_schedule_control(serial)
+    if schedule_order is not None:
         schedule_order.start_time = schedule_order.start_time.astimezone(time_zoneinfo)
         schedule_order.end_time = schedule_order.end_time.astimezone(time_zoneinfo)
-        # TODO@Ziya Modify to case with exceptions
-        if schedule_order and not (db.remove_schedule_order(serial)):
-            # If entry found in control table but unable to remove it.
-            raise HTTPException(
-                status_code=500, detail="Unable to serve schedule order"
-            )
-    except ValueError:
-        pass
 
     # Add the local time and control info in the header
     response.headers["X-local-time"] = (
@@ -112,15 +169,198 @@ async def fetch_control(
     )
 
 
-@router.post("/put-device/", response_model=DeviceData)
+@router.post(
+    "/put-device/",
+    response_model=DeviceData,
+    responses={202: {"description": "Queued to be written (write-behind mode)"}},
+)
 async def put_item(
-    item: DeviceData, db: Annotated[DeviceDataManager, Depends(get_device_db)]
+    item: DeviceData,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    telemetry: Annotated[TelemetryBuffer | None, Depends(get_telemetry_buffer)],
+    response: Response,
 ) -> DeviceData:
+    """
+    Puts device data. In write-behind mode, the data is queued and written in the
+    background (202), a 503 is returned if the queue is full.
+    """
+    if telemetry is not None:
+        if not await telemetry.put(item, Settings.TELEMETRY_ENQUEUE_TIMEOUT):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service Unavailable: Too much device data, retry later",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return item
     try:
-        db.put_device_data(item)
+        await db.put_device_data(item)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal Server Error: Unable to put device data",
         ) from err
     return item
+
+
+@router.post("/put-device-batch", response_model=BatchResult)
+async def put_items(
+    items: Annotated[list[Any], Body(min_length=1, max_length=MAX_BATCH_ITEMS)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+) -> BatchResult:
+    """
+    Puts a batch of device data (e.g. the backlog of a device that was offline),
+    reporting whether each item was written. Invalid items are reported as failed,
+    without preventing the valid ones from being written.
+    """
+    results: list[BatchItemResult | None] = [None] * len(items)
+    valid: list[tuple[int, DeviceData]] = []
+    try:
+        valid = list(enumerate(_device_data_list_adapter.validate_python(items)))
+    except ValidationError:
+        # Validate the items one by one, to find out which ones are invalid
+        for i, item in enumerate(items):
+            try:
+                valid.append((i, _device_data_adapter.validate_python(item)))
+            except ValidationError as err:
+                detail = "; ".join(error["msg"] for error in err.errors())
+                results[i] = BatchItemResult(index=i, success=False, detail=detail)
+
+    if valid:
+        try:
+            written = await db.put_device_data_batch([data for _, data in valid])
+        except RuntimeError as err:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Internal Server Error: Unable to put device data",
+            ) from err
+        for (i, _), success in zip(valid, written, strict=True):
+            results[i] = BatchItemResult(
+                index=i,
+                success=success,
+                detail=None if success else "Unable to put device data",
+            )
+
+    item_results = [result for result in results if result is not None]
+    succeeded = sum(result.success for result in item_results)
+    return BatchResult(
+        succeeded=succeeded,
+        failed=len(item_results) - succeeded,
+        results=item_results,
+    )
+
+
+@websocket_router.websocket("/ws")
+async def control_channel(
+    websocket: WebSocket,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    serial: Serial_Number,
+    timezone_id: str = "Asia/Hong_Kong",
+) -> None:
+    """
+    Persistent control channel for a device, replacing polling of fetch-control.
+
+    The server sends control frames ({"type": "control", "data": ControlData}) as
+    soon as a master order or schedule is placed for the device. The device may
+    send interrupt ({"type": "interrupt", "data": DeviceParamters}), telemetry
+    ({"type": "telemetry", "data": DeviceData}) and refresh ({"type": "refresh"})
+    frames, each answered with an ack or error frame.
+    """
+    try:
+        time_zoneinfo = ZoneInfo(timezone_id)
+    except ZoneInfoNotFoundError as err:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Invalid Timezone ID"
+        ) from err
+
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(frame: ServerFrame) -> None:
+        async with send_lock:
+            await websocket.send_text(frame.model_dump_json(exclude_none=True))
+
+    async def push_control(refresh: bool) -> None:
+        try:
+            master_order, schedule_order = await db.fetch_control_bundle(
+                serial, refresh
+            )
+        except RuntimeError:
+            await send(ServerFrame(type="error", detail="Unable to fetch control data"))
+            return
+        if master_order is None and schedule_order is None:
+            return
+        if schedule_order is not None:
+            schedule_order.start_time = schedule_order.start_time.astimezone(
+                time_zoneinfo
+            )
+            schedule_order.end_time = schedule_order.end_time.astimezone(time_zoneinfo)
+        await send(
+            ServerFrame(
+                type="control",
+                data=ControlData(
+                    Serial_Number=serial,
+                    master_data=master_order,
+                    schedule_data=schedule_order,
+                ),
+            )
+        )
+
+    async def push_changes() -> None:
+        version = db.notification_hub.version(serial, NotificationHub.CONTROL)
+        await push_control(refresh=True)
+        while True:
+            version = await db.notification_hub.wait(
+                serial, NotificationHub.CONTROL, version
+            )
+            await push_control(refresh=False)
+
+    async def handle_frame(frame: DeviceFrame) -> None:
+        try:
+            if isinstance(frame, InterruptFrame):
+                await db.handle_interrupt_signal(serial, frame.data)
+            elif isinstance(frame, TelemetryFrame):
+                if frame.data.Serial_Number != serial:
+                    await send(ServerFrame(type="error", detail="Serial mismatch"))
+                    return
+                await db.put_device_data(frame.data)
+            else:
+                await push_control(refresh=True)
+        except (ValueError, RuntimeError):
+            await send(
+                ServerFrame(type="error", detail=f"Unable to handle {frame.type}")
+            )
+            return
+        await send(ServerFrame(type="ack"))
+
+    async def receive_frames() -> None:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                frame = _device_frame_adapter.validate_json(message)
+            except ValidationError as err:
+                await send(ServerFrame(type="error", detail=str(err)))
+                continue
+            await handle_frame(frame)
+
+    push_task = asyncio.create_task(push_changes())
+    receive_task = asyncio.create_task(receive_frames())
+    try:
+        # Either the device disconnects, or pushing fails (e.g. database errors)
+        await asyncio.wait(
+            (push_task, receive_task), return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        for task in (push_task, receive_task):
+            task.cancel()
+        # Unlike gather, lets a cancellation of this handler through unchanged
+        await asyncio.wait((push_task, receive_task))
+
+    for task in (push_task, receive_task):
+        error = None if task.cancelled() else task.exception()
+        if error is not None and not isinstance(error, WebSocketDisconnect):
+            logger.error("Control channel of %s failed", serial, exc_info=error)
+            # Socket may already be closed by the device
+            with suppress(RuntimeError, WebSocketDisconnect):
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            return
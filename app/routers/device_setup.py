@@ -2,7 +2,7 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Security, status
 
-from ..database import DeviceDataManager, get_device_db
+from ..database import DeviceDataManager, ThreadPoolDataManager, get_device_db
 from ..internal.Authentication import get_current_active_user
 from ..models.SerialNumber import Country_Code, Device_Type, Serial_Number
 
@@ -17,12 +17,12 @@ router = APIRouter(
 
 @router.post("/allocate-serial-number", response_model=str)
 async def get_available_serial(
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
     country_code: Country_Code,
     device_type: Device_Type,
 ) -> Serial_Number:
     try:
-        return db.generate_serial_number(country_code, device_type)
+        return await db.generate_serial_number(country_code, device_type)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -36,11 +36,11 @@ async def get_available_serial(
 
 @router.post("/activate-serial-number", response_model=str)
 async def activate_serial_number(
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
     serial: Serial_Number,
 ) -> str:
     try:
-        db.activate_device_serial(serial)
+        await db.activate_device_serial(serial)
     except ValueError as err:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail=str(err)
@@ -54,11 +54,11 @@ async def activate_serial_number(
 
 @router.get("/is-registered", response_model=bool)
 async def is_registered(
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
     serial: Serial_Number,
 ) -> bool:
     try:
-        return db.is_serial_registered(serial)
+        return await db.is_serial_registered(serial)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,11 +68,11 @@ async def is_registered(
 
 @router.delete("/deactivate-device", response_model=str)
 async def deactivate_device(
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
     serial: Serial_Number,
 ) -> str:
     try:
-        db.deactivate_device_serial(serial)
+        await db.deactivate_device_serial(serial)
     except ValueError as err:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail=str(err)
@@ -1,16 +1,30 @@
-from fastapi import APIRouter, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Security, status
 
-from ..sleepAPI.real_time import get_real_time
+from ..sleepAPI.real_time import get_real_time, iSuke_Status
 from ..models.SerialNumber import Serial_Number
 
 from ..internal.Authentication import get_current_active_user
 
 
+def require_iSuke() -> None:
+    """
+    Disables the Health API (503) while the iSuke credentials are not valid.
+    """
+    if not iSuke_Status.creds_valid:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Health API Disabled!",
+        )
+
+
 router = APIRouter(
     prefix="/medical",
     tags=["Health"],
     responses={404: {"description": "Not Found"}},
-    dependencies=[Security(get_current_active_user, scopes=["Device"])],
+    dependencies=[
+        Security(get_current_active_user, scopes=["Device"]),
+        Depends(require_iSuke),
+    ],
 )
 
 
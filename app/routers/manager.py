@@ -1,12 +1,47 @@
-from typing import Annotated
+import csv
+import io
+from collections.abc import AsyncIterator
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Security, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    Security,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
-from ..database import DeviceDataManager, get_device_db
+from ..database import (
+    DeviceDataManager,
+    ThreadPoolDataManager,
+    get_db_stats,
+    get_device_db,
+)
 from ..internal.Authentication import get_current_active_user
-from ..models.Device import DeviceData, MasterData
+from ..internal.cache import etag_matches, payload_etag
+from ..internal.pagination import decode_cursor, encode_cursor
+from ..internal.rollup import Bucket, DeviceHistoryColumns, rollup
+from ..models.Device import DeviceData, DeviceHistoryRollup, MasterData
 from ..models.SerialNumber import Serial_Number
 
+# Items returned per page of device history (by default, and at most)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Items read per query by the device history export
+EXPORT_PAGE_SIZE = 500
+# Longest gap (in seconds) between two items of device history counted towards the
+# time spent in an element, longer gaps are the device being offline
+MAX_ROLLUP_GAP = 3600
+# Columns of the CSV export of device history, the state is split in two columns
+_CSV_COLUMNS = [name for name in DeviceData.model_fields if name != "state"] + [
+    "element",
+    "intensity",
+]
+
 router = APIRouter(
     prefix="/manager",
     tags=["Manager"],
@@ -19,10 +54,10 @@ router = APIRouter(
 async def put_order(
     serial_number: Serial_Number,
     item: MasterData,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
 ) -> MasterData:
     try:
-        db.put_master_order(serial_number, item)
+        await db.put_master_order(serial_number, item)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -34,10 +69,17 @@ async def put_order(
 @router.get("/get-master-state", response_model=MasterData)
 async def get_master_state(
     serial: Serial_Number,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
-) -> MasterData:
+    response: Response,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> MasterData | Response:
+    """
+    Get the current state of the device. The response carries an ETag (a hash of
+    the state), if it matches the If-None-Match header 304 Not Modified is
+    returned instead.
+    """
     try:
-        item = db.get_master_data(serial, "History")
+        item = await db.get_master_data(serial, "History")
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -45,22 +87,237 @@ async def get_master_state(
         ) from err
 
     if item is not None:
+        etag = payload_etag(item)
+        if etag_matches(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response.headers["ETag"] = etag
         return item
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
 
+def _history_start_key(serial: str, cursor: str | None) -> dict | None:
+    """
+    [For internal use only] Decodes a device history cursor, which must have been
+    issued for the same device.
+    """
+    if cursor is None:
+        return None
+    try:
+        start_key = decode_cursor(cursor)
+    except ValueError:
+        start_key = None
+    if start_key is None or start_key.keys() != {"Serial_Number", "Local_Time_Str"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bad Request: Invalid cursor",
+        )
+    if start_key["Serial_Number"] != serial:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bad Request: Cursor issued for another device",
+        )
+    return start_key
+
+
+def _check_time_range(start: str | None, end: str | None) -> None:
+    """
+    [For internal use only] Checks that from is not after to (compared as
+    Local_Time_Str is, as strings), which DynamoDB rejects.
+    """
+    if start is not None and end is not None and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bad Request: from must not be after to",
+        )
+
+
 @router.get("/get-device-history", response_model=list[DeviceData])
 async def get_item(
     serial: Serial_Number,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    response: Response,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    start: Annotated[str | None, Query(alias="from")] = None,
+    end: Annotated[str | None, Query(alias="to")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    order: Literal["newest", "oldest"] = "newest",
+    cursor: str | None = None,
 ) -> list[DeviceData]:
+    """
+    Get a page of the history of a device, with Local_Time_Str between from and to
+    (inclusive, if given), newest first unless order is "oldest".
+
+    If there are more items, the X-Next-Cursor response header holds the cursor to
+    pass (with the same parameters) to get the next page.
+    """
+    _check_time_range(start, end)
+    start_key = _history_start_key(serial, cursor)
     try:
-        items = db.get_device_data(serial)
+        items, last_key = await db.query_device_data(
+            serial, start, end, limit, order == "newest", start_key
+        )
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal Server Error: Issue with database encountered",
         ) from err
-    if items:
+    if last_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(last_key)
+    if items or cursor is not None:
         return items
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+
+
+async def _read_device_history(
+    db: ThreadPoolDataManager[DeviceDataManager],
+    serial: str,
+    start: str | None,
+    end: str | None,
+    newest_first: bool,
+) -> AsyncIterator[DeviceData]:
+    """
+    [For internal use only] Reads the first page of the history of a device, and
+    returns an iterator yielding it and then the following pages (read lazily, one
+    at a time).
+
+    # Exceptions
+    Raises a RuntimeError if there is an issue with reading the first page.
+    """
+    items, start_key = await db.query_device_data(
+        serial, start, end, EXPORT_PAGE_SIZE, newest_first, None
+    )
+    return _iter_device_history(db, serial, start, end, newest_first, items, start_key)
+
+
+async def _iter_device_history(
+    db: ThreadPoolDataManager[DeviceDataManager],
+    serial: str,
+    start: str | None,
+    end: str | None,
+    newest_first: bool,
+    items: list[DeviceData],
+    start_key: dict | None,
+) -> AsyncIterator[DeviceData]:
+    """
+    [For internal use only] Lazily yields the history of a device from a page that
+    has been read, reading the following ones one at a time.
+    """
+    while True:
+        for item in items:
+            yield item
+        if start_key is None:
+            return
+        items, start_key = await db.query_device_data(
+            serial, start, end, EXPORT_PAGE_SIZE, newest_first, start_key
+        )
+
+
+def _csv_row(values: list) -> str:
+    """
+    [For internal use only] Formats a row of CSV.
+    """
+    line = io.StringIO()
+    csv.writer(line).writerow(values)
+    return line.getvalue()
+
+
+async def _export_lines(
+    history: AsyncIterator[DeviceData], export_format: Literal["ndjson", "csv"]
+) -> AsyncIterator[str]:
+    """
+    [For internal use only] Serializes device history as NDJSON or CSV lines.
+    """
+    if export_format == "csv":
+        yield _csv_row(_CSV_COLUMNS)
+    async for data in history:
+        if export_format == "ndjson":
+            yield data.model_dump_json() + "\n"
+        else:
+            row = data.model_dump(mode="json", exclude={"state"})
+            yield _csv_row([*row.values(), data.state.element, data.state.intensity])
+
+
+@router.get("/device-history/export", response_class=StreamingResponse)
+async def export_device_history(
+    serial: Serial_Number,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    start: Annotated[str | None, Query(alias="from")] = None,
+    end: Annotated[str | None, Query(alias="to")] = None,
+    order: Literal["newest", "oldest"] = "oldest",
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = (
+        "ndjson"
+    ),
+) -> StreamingResponse:
+    """
+    Streams the whole history of a device (with Local_Time_Str between from and to,
+    if given) as NDJSON (one DeviceData per line) or CSV. The history is read from
+    the database page by page while the response is sent, its first page before
+    (so that errors reading it are reported).
+    """
+    _check_time_range(start, end)
+    try:
+        history = await _read_device_history(db, serial, start, end, order == "newest")
+    except RuntimeError as err:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Server Error: Issue with database encountered",
+        ) from err
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_lines(history, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{serial}-history.{export_format}"'
+            )
+        },
+    )
+
+
+@router.get("/device-history/rollup", response_model=DeviceHistoryRollup)
+async def rollup_device_history(
+    serial: Serial_Number,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    bucket: Bucket = "day",
+    start: Annotated[str | None, Query(alias="from")] = None,
+    end: Annotated[str | None, Query(alias="to")] = None,
+    max_gap: Annotated[int, Query(ge=0, le=7 * 86400)] = MAX_ROLLUP_GAP,
+) -> DeviceHistoryRollup:
+    """
+    Aggregates the history of a device (with Local_Time_Str between from and to, if
+    given) per hour, day or week: mean/min/max of temperature, humidity and
+    wind_speed, mean intensity and time spent in each element, and duty cycle
+    (fraction of the bucket with an intensity above 0).
+
+    Each item is taken to last until the next one, up to max_gap seconds.
+    """
+    _check_time_range(start, end)
+    columns = DeviceHistoryColumns()
+    try:
+        history = await _read_device_history(db, serial, start, end, False)
+        async for item in history:
+            columns.append(item)
+    except RuntimeError as err:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Server Error: Issue with database encountered",
+        ) from err
+    if not columns and not columns.skipped:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Item not found"
+        )
+    return DeviceHistoryRollup(
+        bucket=bucket,
+        **rollup(columns, bucket, max_gap),
+        skipped=columns.skipped,
+    )
+
+
+@router.get("/db-stats")
+async def db_stats() -> dict:
+    """
+    Returns the saturation of the database thread pool, the state of the telemetry
+    buffer and the hit/miss counts of the caches, for monitoring.
+    """
+    return get_db_stats()
@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    status,
+    Security,
+)
+from fastapi.responses import StreamingResponse
 
-from ..database import DeviceDataManager, get_device_db
+from ..database import DeviceDataManager, ThreadPoolDataManager, get_device_db
+from ..database.NotificationHub import NotificationHub
 
 # Models
 from ..internal.Authentication import get_current_active_user
+from ..internal.cache import etag_matches
 from ..models.Device import ClientData, MasterData, ScheduleData, DeviceParamters
 from ..models.SerialNumber import Serial_Number
 
 # Utilities
+from collections.abc import AsyncGenerator
+from decimal import Decimal
 from datetime import datetime, timezone
 from typing import Annotated
 
+# Seconds between heartbeats sent on an idle device state stream
+HEARTBEAT_SECONDS = 15
+
 router = APIRouter(
     prefix="/mobile",
     tags=["Mobile"],
@@ -19,8 +36,8 @@ router = APIRouter(
 )
 
 
-def init_device_state(
-    serial_number: Serial_Number, db: DeviceDataManager
+async def init_device_state(
+    serial_number: Serial_Number, db: ThreadPoolDataManager[DeviceDataManager]
 ) -> MasterData:
     """
     Initializes the device state to default values. Raises RuntimeError if
@@ -30,7 +47,7 @@ def init_device_state(
         user_touch_allowed=True,
         updates=DeviceParamters(element="OFF", intensity=0),
     )
-    db.put_master_order(serial_number, desired_state)
+    await db.put_master_order(serial_number, desired_state)
     return desired_state
 
 
@@ -38,23 +55,29 @@ def init_device_state(
 async def put_schedule(
     serial_number: Serial_Number,
     schedule_data: ScheduleData,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
 ) -> ScheduleData:
     """
     The start and end time for the schedule should obey iso8601 with offset format
     (timezone aware) (e.g. "2024-07-07 11:53:37.178721+00:00").
+
+    A recurring schedule (e.g. every night of a sleep study) is given by its first
+    occurrence and a recurrence: "daily" or "weekly", either a count of occurrences
+    or the time until which they start, and the timezone keeping their wall clock
+    time (e.g. "Asia/Hong_Kong"). It conflicts with any schedule between its first
+    and last occurrence.
     """
 
     try:
-        if not db.is_serial_registered(serial_number):
+        if not await db.is_serial_registered(serial_number):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Bad Request: Device (Serial Number) Not Found",
             )
 
-        device_state = db.get_master_data(serial_number, "History")
+        device_state = await db.get_master_data(serial_number, "History")
         if device_state is None:
-            device_state = init_device_state(serial_number, db)
+            device_state = await init_device_state(serial_number, db)
 
     except RuntimeError as err:
         raise HTTPException(
@@ -77,7 +100,7 @@ async def put_schedule(
                 detail="Bad Request: Start time cannot be in the past",
             )
 
-        db.put_schedule(serial_number, schedule_data)
+        await db.put_schedule(serial_number, schedule_data)
     except ValueError as err:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -95,14 +118,22 @@ async def put_schedule(
 @router.get("/get-schedules", response_model=list[ScheduleData])
 async def get_schedules(
     serial_number: Serial_Number,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
-) -> list[ScheduleData]:
+    response: Response,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> list[ScheduleData] | Response:
     """
     Get all scheduled aroma events for a device (given its serial number),
-    returns an empty list if no schedules are found.
+    returns an empty list if no schedules are found. Recurring schedules start from
+    their current (or next) occurrence.
+
+    The response carries an ETag (the version of the schedules, bumped on every
+    write, and the first end of one of their occurrences), if it matches the
+    If-None-Match header 304 Not Modified is returned instead, without reading the
+    schedules.
     """
     try:
-        if not db.is_serial_registered(serial_number):
+        if not await db.is_serial_registered(serial_number):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Bad Request: Device (Serial Number) Not Found",
@@ -115,20 +146,43 @@ async def get_schedules(
         ) from err
 
     try:
-        return db.get_schedules(serial_number)
+        # Read before the schedules, a write in between only makes the ETag stale
+        version, valid_until = await db.get_schedules_version(serial_number)
+        if valid_until is not None:
+            etag = _schedules_etag(version, valid_until)
+            if etag_matches(if_none_match, etag):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+                )
+        schedules = await db.get_schedules(serial_number)
+        if valid_until is None:
+            await db.record_schedules_version(serial_number, version, schedules)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal Server Error: Error in retrieving schedules",
         ) from err
 
+    response.headers["ETag"] = _schedules_etag(
+        version, DeviceDataManager.schedules_valid_until(schedules)
+    )
+    return schedules
+
+
+def _schedules_etag(version: int, valid_until: Decimal) -> str:
+    """
+    [For internal use only] Returns the ETag of a device's schedules, from their
+    version and until when they stay the same (see DeviceDataManager).
+    """
+    return f'"{version}-{valid_until}"'
+
 
 @router.post("/update-state", responses={202: {"model": DeviceParamters}})
 async def request_state_update(
     serial_number: Serial_Number,
     client_request: ClientData,
     response: Response,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
 ) -> DeviceParamters:
     """
     Request to change device state from the mobile page/app.
@@ -138,15 +192,15 @@ async def request_state_update(
     also be rejected if permissions deisbaled (from admin/manager).
     """
     try:
-        if not db.is_serial_registered(serial_number):
+        if not await db.is_serial_registered(serial_number):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Bad Request: Device (Serial Number) Not Found",
             )
 
-        device_state = db.get_master_data(serial_number, "History")
+        device_state = await db.get_master_data(serial_number, "History")
         if device_state is None:
-            device_state = init_device_state(serial_number, db)
+            device_state = await init_device_state(serial_number, db)
 
     except RuntimeError as err:
         raise HTTPException(
@@ -176,7 +230,7 @@ async def request_state_update(
     new_update = DeviceParamters(element=new_element, intensity=new_intensity)
 
     try:
-        db.put_master_order(
+        await db.put_master_order(
             serial_number,
             MasterData(
                 user_touch_allowed=True,
@@ -197,21 +251,21 @@ async def request_state_update(
 @router.get("/get-device-state", response_model=ClientData)
 async def get_device_state(
     serial_number: Serial_Number,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
 ) -> ClientData:
     """
     Receive the current state of the device (element and intensity)
     along with the permissions
     """
     try:
-        if not db.is_serial_registered(serial_number):
+        if not await db.is_serial_registered(serial_number):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Not Found: Device (Serial Number) Not Found",
             )
-        device_state = db.get_master_data(serial_number, "History")
+        device_state = await db.get_master_data(serial_number, "History")
         if device_state is None:
-            device_state = init_device_state(serial_number, db)
+            device_state = await init_device_state(serial_number, db)
     except RuntimeError as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER,
@@ -222,17 +276,85 @@ async def get_device_state(
     return ClientData(updates=device_state.updates)
 
 
+def _state_event(state: DeviceParamters) -> str:
+    """Formats the device state as a Server-Sent Event."""
+    return f"event: state\ndata: {ClientData(updates=state).model_dump_json()}\n\n"
+
+
+@router.get(
+    "/stream-device-state",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def stream_device_state(
+    serial_number: Serial_Number,
+    request: Request,
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
+) -> StreamingResponse:
+    """
+    Stream the state of the device (element and intensity) as Server-Sent Events,
+    replacing polling of get-device-state. A "state" event (with ClientData) is
+    sent when the stream opens and whenever the state changes, and a heartbeat
+    comment is sent every HEARTBEAT_SECONDS otherwise.
+    """
+    hub = db.notification_hub
+    version = hub.version(serial_number, NotificationHub.HISTORY)
+    try:
+        if not await db.is_serial_registered(serial_number):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Not Found: Device (Serial Number) Not Found",
+            )
+        device_state = await db.get_master_data(serial_number, "History")
+        if device_state is None:
+            device_state = await init_device_state(serial_number, db)
+    except RuntimeError as err:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=(
+                "Internal Server Error: Unable to retrieve device state from database"
+            ),
+        ) from err
+
+    async def events(version: int, last_state: DeviceParamters) -> AsyncGenerator:
+        yield _state_event(last_state)
+        while not await request.is_disconnected():
+            new_version = await hub.wait(
+                serial_number, NotificationHub.HISTORY, version, HEARTBEAT_SECONDS
+            )
+            if new_version == version:
+                yield ": heartbeat\n\n"
+                continue
+            version = new_version
+
+            try:
+                device_state = await db.get_master_data(serial_number, "History")
+            except RuntimeError:
+                yield "event: error\ndata: Unable to retrieve device state\n\n"
+                return
+            if device_state is not None and device_state.updates != last_state:
+                last_state = device_state.updates
+                yield _state_event(last_state)
+
+    return StreamingResponse(
+        events(version, device_state.updates),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.delete("/delete-schedule", response_model=ScheduleData)
 async def delete_schedule(
     serial_number: Serial_Number,
     start_time: datetime,
-    db: Annotated[DeviceDataManager, Depends(get_device_db)],
+    db: Annotated[ThreadPoolDataManager[DeviceDataManager], Depends(get_device_db)],
 ) -> ScheduleData:
     """
-    Delete a scheduled aroma event for a device (given its serial number).
+    Delete a scheduled aroma event for a device (given its serial number). The
+    start time of any occurrence of a recurring schedule deletes all of them.
     """
     try:
-        return db.remove_schedule(serial_number, start_time)
+        return await db.remove_schedule(serial_number, start_time)
     except ValueError as err:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,5 +1,7 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import UTC, datetime, timedelta
 from ..internal.credentials import iSuke_credentials
+from ..internal.Debug.utils import print_info, print_warn
 
 import httpx
 
@@ -14,12 +16,22 @@ def _update_token(api_url: str, api_key: str, customer_code: str) -> str:
     return response["data"]
 
 
-def check_iSuke_API(api_url: str, api_key: str, customer_code: str) -> bool:
+async def check_iSuke_API_async(
+    api_url: str, api_key: str, customer_code: str, timeout: float
+) -> bool:
+    """
+    Checks the iSuke credentials by getting a token from the API, failing if it does
+    not answer within timeout seconds.
+    """
+    params = {"apiKey": api_key, "customerCode": customer_code}
     try:
-        _update_token(api_url, api_key, customer_code)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await asyncio.wait_for(
+                client.post(api_url + "auth/getToken", params=params), timeout
+            )
+        return response.json()["code"] == "0000"
     except Exception:
         return False
-    return True
 
 
 try:
@@ -28,11 +40,45 @@ except (FileNotFoundError, ValueError):
     _iSuke_creds_loaded = False
 else:
     _iSuke_creds_loaded = True
-finally:
-    if _iSuke_creds_loaded:
-        iSuke_creds_valid = check_iSuke_API(API_URL, API_KEY, CUSTOMER_CODE)
-    else:
-        iSuke_creds_valid = False
+
+
+class iSuke_Status:
+    # Whether the credentials were accepted by the iSuke API, see probe_iSuke_API
+    creds_valid = False
+    last_checked: datetime | None = None
+
+
+async def probe_iSuke_API(timeout: float) -> bool:
+    """
+    Checks the iSuke credentials (if loaded) against the API, storing the result in
+    iSuke_Status.creds_valid. A timeout counts as invalid credentials.
+    """
+    valid = _iSuke_creds_loaded and await check_iSuke_API_async(
+        API_URL, API_KEY, CUSTOMER_CODE, timeout
+    )
+    if iSuke_Status.last_checked is None or valid != iSuke_Status.creds_valid:
+        if valid:
+            print_info("iSuke Credentials are valid! Health API Enabled!")
+        else:
+            print_warn("iSuke Credentials are invalid! Health API Disabled!")
+    iSuke_Status.creds_valid = valid
+    iSuke_Status.last_checked = datetime.now(UTC)
+    return valid
+
+
+async def monitor_iSuke_API(
+    interval: float, retry_interval: float, timeout: float
+) -> None:
+    """
+    Probes the iSuke API every interval seconds (retry_interval while the credentials
+    are invalid), enabling or disabling the Health API. Runs until cancelled.
+    """
+    while True:
+        valid = await probe_iSuke_API(timeout)
+        if not _iSuke_creds_loaded:
+            # Missing or malformed credentials, nothing to revalidate
+            return
+        await asyncio.sleep(interval if valid else retry_interval)
 
 
 serial_to_MAC_map: dict[str, str] = {
@@ -0,0 +1,47 @@
+"""
+Benchmark of the per-request cost of token authentication, with and without the
+verified token cache. Run from the repository root (requires the same credentials
+as the tests):
+
+    python -m app.tests.Benchmark.auth_benchmark [iterations]
+"""
+
+import sys
+import timeit
+from datetime import timedelta
+
+from ...internal import Authentication
+from ...internal.cache import TTLCache
+
+
+def _time_per_call(func, token: str, iterations: int) -> float:
+    "Returns the best time per call (in microseconds) over a few repeats."
+    best = min(timeit.repeat(lambda: func(token), number=iterations, repeat=5))
+    return best / iterations * 1e6
+
+
+def main(iterations: int = 10000) -> None:
+    token = Authentication._create_access_token(
+        {"sub": "benchmark-user", "scopes": ["Device", "Mobile"]},
+        expires_delta=timedelta(minutes=30),
+    )
+
+    uncached = _time_per_call(Authentication._verify_token, token, iterations)
+
+    # Swap in a fresh cache, so the run is not affected by other tokens
+    token_cache = Authentication._token_cache
+    Authentication._token_cache = TTLCache(maxsize=16, ttl=3600)
+    try:
+        cached = _time_per_call(Authentication._get_verified_token, token, iterations)
+        stats = Authentication._token_cache.stats()
+    finally:
+        Authentication._token_cache = token_cache
+
+    print(f"Token verification, {iterations} requests per run (best of 5)")
+    print(f"  without cache: {uncached:8.2f} us/request")
+    print(f"  with cache:    {cached:8.2f} us/request ({uncached / cached:.1f}x)")
+    print(f"  cache stats:   {stats}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,12 +1,15 @@
 import pytest
 from fastapi.testclient import TestClient
 from ...models.Device import ScheduleData, DeviceParamters, MasterData
-from ...database import DeviceDataManager, get_device_db
+from ...database import DeviceDataManager, get_sync_device_db
 from datetime import datetime
 from ..Utils.registration import (
     remove_master_history,
     remove_master_order,
     put_master_order,
+    register_user_with_scopes,
+    get_test_access_token,
+    delete_manager,
 )
 
 
@@ -96,7 +99,7 @@ def test_user_touch_allowed_true(
 
 
 def test_schedule(get_serial_number) -> None:
-    db: DeviceDataManager = get_device_db()
+    db: DeviceDataManager = get_sync_device_db()
     data = ScheduleData(
         start_time=datetime.fromisoformat("2068-07-11 09:17:24.049946+00:00"),
         end_time=datetime.fromisoformat("2068-07-11 10:17:24.049946+00:00"),
@@ -184,3 +187,46 @@ def test_fetch_control_interrupt(
     )
     assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
     assert response.json()["updates"] == updateData, "Failed to interrupt fetch control"
+
+
+def test_disable_user(
+    test_client: TestClient,
+    get_root_token: str,
+    get_username: str,
+    get_password: str,
+) -> None:
+    username = get_username + "-Disabled"
+    register_user_with_scopes(
+        test_client, username, get_password, get_root_token, "Mobile"
+    )
+    token = get_test_access_token(test_client, username, get_password, ["Mobile"])
+
+    # Cached user must not outlive it being disabled
+    response = test_client.get(
+        "/users/me/", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+
+    response = test_client.put(
+        f"/users/disable?username={username}",
+        headers={"Authorization": f"Bearer {get_root_token}"},
+    )
+    assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+    assert response.json()["disabled"], "User not disabled"
+
+    response = test_client.get(
+        "/users/me/", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert (
+        response.status_code == 400
+    ), f"Expected 400 Bad Request, got {response.json()}"
+
+    delete_manager(test_client, username, get_root_token)
+
+    response = test_client.put(
+        f"/users/disable?username={username}",
+        headers={"Authorization": f"Bearer {get_root_token}"},
+    )
+    assert (
+        response.status_code == 404
+    ), f"Expected 404 Not Found, got {response.json()}"
@@ -0,0 +1,102 @@
+from ...internal import Authentication
+from ...internal.cache import TTLCache
+from ...models.Authentication import User, UserInDB
+from fastapi.security import SecurityScopes
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+import pytest
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+
+
+@pytest.fixture
+def token_cache(monkeypatch: pytest.MonkeyPatch) -> TTLCache:
+    # Fresh cache, so tests are not affected by other tokens
+    cache = TTLCache(maxsize=16, ttl=3600)
+    monkeypatch.setattr(Authentication, "_token_cache", cache)
+    return cache
+
+
+def _create_token(expires_delta: timedelta) -> str:
+    return Authentication._create_access_token(
+        {"sub": "cache-test-user", "scopes": ["Mobile"]}, expires_delta
+    )
+
+
+def test_token_cache_reuses_verified_token(token_cache: TTLCache) -> None:
+    token = _create_token(timedelta(minutes=30))
+
+    verified = Authentication._get_verified_token(token)
+    assert token_cache.stats() == {"hits": 0, "misses": 1, "size": 1}
+    assert Authentication._get_verified_token(token) is verified, "Token not reused"
+    assert token_cache.stats()["hits"] == 1, "Token not served from cache"
+    assert verified.token_data.username == "cache-test-user"
+    assert verified.scopes == {"Mobile"}
+
+
+def test_token_cache_rejects_tampered_token(token_cache: TTLCache) -> None:
+    token = _create_token(timedelta(minutes=30))
+    Authentication._get_verified_token(token)
+
+    # Same claims, another signature, does not match the cached token
+    header, claims, signature = token.split(".")
+    tampered_signature = ("A" if signature[0] != "A" else "B") + signature[1:]
+    with pytest.raises(InvalidTokenError):
+        Authentication._get_verified_token(f"{header}.{claims}.{tampered_signature}")
+    assert token_cache.stats()["size"] == 1, "Tampered token cached"
+
+
+def test_token_cache_rejects_expired_token(token_cache: TTLCache) -> None:
+    with pytest.raises(ExpiredSignatureError):
+        Authentication._get_verified_token(_create_token(timedelta(minutes=-1)))
+    assert token_cache.stats()["size"] == 0, "Expired token cached"
+
+    # A cached token is dropped once it expires, rather than after the cache's ttl
+    token = _create_token(timedelta(seconds=1))
+    Authentication._get_verified_token(token)
+    time.sleep(1.1)
+    with pytest.raises(ExpiredSignatureError):
+        Authentication._get_verified_token(token)
+
+
+def test_token_cache_ttl_follows_exp(token_cache: TTLCache) -> None:
+    token = _create_token(timedelta(minutes=2))
+    exp = Authentication._get_verified_token(token).claims["exp"]
+
+    expires_at, _ = token_cache._entries[hashlib.sha256(token.encode()).digest()]
+    ttl = expires_at - time.monotonic()
+    assert (
+        abs(ttl - (exp - time.time())) < 1
+    ), f"Cached for {ttl:.0f}s, expected until exp (not the cache's 3600s)"
+
+
+def test_token_user_skips_validation(
+    token_cache: TTLCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stored = UserInDB(
+        username="cache-test-user",
+        full_name="Cache Test",
+        disabled=False,
+        hashed_password="hash",
+        scopes="Mobile",
+        last_login="2024-01-01T00:00:00",
+    )
+
+    class CachedUserDB:
+        async def get_user(self, username: str, is_login_attempt: bool) -> UserInDB:
+            return stored
+
+    def validate(*args, **kwargs) -> None:
+        raise AssertionError("Cached user validated again")
+
+    monkeypatch.setattr(User, "__init__", validate)
+    user = asyncio.run(
+        Authentication._get_token_user(
+            _create_token(timedelta(minutes=30)),
+            SecurityScopes(["Mobile"]),
+            CachedUserDB(),
+        )
+    )
+    assert type(user) is User, "Stored user (with its password hash) returned"
+    assert user.model_dump() == stored.model_dump(include=set(User.model_fields))
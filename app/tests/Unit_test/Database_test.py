@@ -0,0 +1,35 @@
+from ...database import DeviceDataManager, get_sync_device_db, get_sync_user_db
+from ...database.DynamoDBSession import DynamoDBSession
+from ...internal.config import Settings
+import threading
+
+
+def test_shared_connection_pool() -> None:
+    device_db, user_db = get_sync_device_db(), get_sync_user_db()
+    assert device_db.dyn_resource is user_db.dyn_resource, "Resource not shared"
+
+    config = device_db.dyn_resource.meta.client.meta.config
+    assert config.max_pool_connections == Settings.AWS_MAX_POOL_CONNECTIONS
+    assert config.retries["mode"] == Settings.AWS_RETRY_MODE
+
+
+def test_resource_per_thread() -> None:
+    session = DynamoDBSession("us-east-1", "key-id", "secret-key")
+    resources: list = []
+    thread = threading.Thread(target=lambda: resources.append(session.resource()))
+    thread.start()
+    thread.join()
+
+    assert session.resource() is session.resource(), "Resource not reused"
+    assert resources[0] is not session.resource(), "Resource shared by threads"
+
+
+def test_load_tables_without_describe() -> None:
+    db = DeviceDataManager(get_sync_device_db().dyn_resource)
+    missing_tables = ("Missing_Table",) * 6
+    assert db.load_tables(*missing_tables, describe=False)
+    assert db.device_table is not None, "Tables not bound"
+    assert not db.load_tables(*missing_tables), "Missing tables not reported"
+
+    assert not db.table_exists("Missing_Table"), "Missing table not reported"
+    assert db.table_exists(get_sync_device_db().device_table.name)
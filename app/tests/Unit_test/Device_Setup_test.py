@@ -1,3 +1,4 @@
+from ...database import DeviceDataManager
 from fastapi.testclient import TestClient
 import pytest
 
@@ -16,3 +17,22 @@ def test_apply_register_device(
     )
     print(response.json())
     assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+
+
+def test_serial_registration_cache(device_db: DeviceDataManager) -> None:
+    serial_code = "0100000099"
+    serial = "TEST" + serial_code
+
+    # Unknown serial numbers are cached too, and invalidated on registration
+    assert not device_db.is_serial_registered(serial)
+    device_db._register_testing_device(serial_code)
+    try:
+        assert device_db.is_serial_registered(serial), "Stale registration cached"
+
+        hits = device_db.serial_cache.hits
+        assert device_db.is_serial_registered(serial)
+        assert device_db.serial_cache.hits == hits + 1, "Serial not served from cache"
+    finally:
+        device_db._deregister_testing_device(serial_code)
+
+    assert not device_db.is_serial_registered(serial), "Stale registration cached"
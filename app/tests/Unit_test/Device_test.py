@@ -1,7 +1,10 @@
-from ...database import DeviceDataManager, get_device_db
+from ...database import DeviceDataManager, get_sync_device_db
+from ...database.TelemetryBuffer import TelemetryBuffer
+from ...database.ThreadPoolManager import MeteredThreadPool, ThreadPoolDataManager
 from ...models.Device import DeviceData, MasterData, DeviceParamters
 import pytest
 from fastapi.testclient import TestClient
+from fastapi import WebSocketDisconnect, status
 from ..Utils.registration import (
     put_master_order,
     register_user_with_scopes,
@@ -10,7 +13,10 @@ from ..Utils.registration import (
     remove_master_order,
     remove_master_history,
 )
+from collections.abc import Callable
 from decimal import Decimal
+import asyncio
+import threading
 
 
 @pytest.fixture(scope="module")
@@ -40,7 +46,7 @@ class TestDevice:
         get_device_token: str,
         get_serial_number: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
 
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
@@ -67,6 +73,130 @@ class TestDevice:
         remove_master_order(get_serial_number)
         remove_master_history(get_serial_number)
 
+    def test_fetch_control_consumes_control(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+        get_schedule_data,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+
+        putData = MasterData(
+            updates=DeviceParamters(element="Fire", intensity=30),
+            user_touch_allowed=True,
+        )
+        put_master_order(get_serial_number, putData)
+
+        response = test_client.post(
+            f"/device/fetch-control?serial={get_serial_number}&refresh=true",
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert response.json()["master_data"] == putData.model_dump()
+        assert response.json()["schedule_data"] is not None, "Schedule not served"
+
+        assert db.get_master_data(get_serial_number, "Order") is None
+        assert db.get_master_data(get_serial_number, "History") == putData
+
+        response = test_client.post(
+            f"/device/fetch-control?serial={get_serial_number}&refresh=false",
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+        assert (
+            response.status_code == 404
+        ), f"Expected 404 Not Found, got {response.json()}"
+
+        remove_master_history(get_serial_number)
+
+    def test_serve_order_once(self, get_serial_number: str) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+
+        putData = MasterData(
+            updates=DeviceParamters(element="Earth", intensity=20),
+            user_touch_allowed=True,
+        )
+        put_master_order(get_serial_number, putData)
+
+        assert db.serve_order(get_serial_number, putData), "Failed to serve order"
+        assert not db.serve_order(
+            get_serial_number, putData
+        ), "Order should not be served twice"
+        assert db.get_master_data(get_serial_number, "Order") is None
+        assert db.get_master_data(get_serial_number, "History") == putData
+
+        remove_master_history(get_serial_number)
+
+    def test_history_cache(self, get_serial_number: str) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+
+        putData = MasterData(
+            updates=DeviceParamters(element="Earth", intensity=60),
+            user_touch_allowed=False,
+        )
+        put_master_order(get_serial_number, putData)
+        assert db.serve_order(get_serial_number, putData), "Failed to serve order"
+
+        # Served order is written through to the cache, no read from DynamoDB
+        hits = db.history_cache.hits
+        assert db.get_master_data(get_serial_number, "History") == putData
+        assert db.history_cache.hits == hits + 1, "History not served from cache"
+
+        update = DeviceParamters(element="Fire", intensity=5)
+        db.handle_interrupt_signal(get_serial_number, update)
+        db.history_cache.clear()
+        assert db.get_master_data(get_serial_number, "History") == MasterData(
+            updates=update, user_touch_allowed=False
+        ), "Cached state differs from the Master History Table"
+
+        remove_master_history(get_serial_number)
+        assert db.get_master_data(get_serial_number, "History") is None
+
+    def test_threadpool_data_manager(
+        self, get_serial_number: str, thread_device_db: Callable[[], DeviceDataManager]
+    ) -> None:
+        managers: list[DeviceDataManager] = []
+
+        def thread_db() -> DeviceDataManager:
+            managers.append(thread_device_db())
+            return managers[-1]
+
+        pool = MeteredThreadPool(max_workers=2)
+        db = ThreadPoolDataManager(thread_db, pool)
+
+        async def read_states() -> list:
+            return await asyncio.gather(
+                *(db.get_master_data(get_serial_number, "Order") for _ in range(5))
+            )
+
+        def unbound_db() -> DeviceDataManager:
+            db = thread_device_db()
+            db.master_order_table = None
+            return db
+
+        try:
+            assert asyncio.run(read_states()) == [None] * 5
+            stats = pool.stats()
+            # Errors raised in the pool threads reach the caller
+            with pytest.raises(RuntimeError):
+                asyncio.run(
+                    ThreadPoolDataManager(unbound_db, pool).get_master_data(
+                        get_serial_number, "Order"
+                    )
+                )
+        finally:
+            pool.shutdown()
+
+        assert stats["submitted"] == stats["completed"] == 5
+        assert 1 <= stats["peak_active"] <= 2, "Pool size not respected"
+        # One manager for the calling thread, and one per pool thread
+        assert 2 <= len(managers) <= 3
+        resources = {id(manager.dyn_resource) for manager in managers}
+        assert len(resources) == len(managers), "Resource shared by threads"
+        assert db.notification_hub is get_sync_device_db().notification_hub
+        with pytest.raises(AttributeError):
+            db.master_order_table = None
+
     def test_fetch_control_no_master_order(
         self,
         test_client: TestClient,
@@ -81,25 +211,130 @@ class TestDevice:
             response.status_code == 404
         ), f"Expected 404 Not Found, got {response.json()}"
 
-    def test_put_device(
-        self, test_client: TestClient, get_device_token: str, get_serial_number: str
+    def test_fetch_control_long_poll_timeout(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+    ) -> None:
+        response = test_client.post(
+            f"/device/fetch-control?serial={get_serial_number}"
+            + "&refresh=false&wait_seconds=0.2",
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+        assert (
+            response.status_code == 404
+        ), f"Expected 404 Not Found, got {response.json()}"
+
+    def test_fetch_control_long_poll(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+    ) -> None:
+        putData = MasterData(
+            updates=DeviceParamters(element="Metal", intensity=10),
+            user_touch_allowed=True,
+        )
+        timer = threading.Timer(
+            0.5, put_master_order, args=(get_serial_number, putData)
+        )
+        timer.start()
+
+        response = test_client.post(
+            f"/device/fetch-control?serial={get_serial_number}"
+            + "&refresh=false&wait_seconds=10",
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+        timer.join()
+
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert response.json()["master_data"] == putData.model_dump()
+
+        remove_master_history(get_serial_number)
+
+    def test_control_channel(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
-        putData = DeviceData(
-            Serial_Number=get_serial_number,
-            Local_Time_Str="string",
-            local_ip="string",
-            location="string",
-            region="string",
-            country="string",
-            latitude="string",
-            longitude="string",
-            temperature=Decimal(0),
-            condition="string",
-            wind_speed=Decimal(0),
-            humidity=Decimal(0),
-            state=DeviceParamters(element="Fire", intensity=40),
+        db: DeviceDataManager = get_sync_device_db()
+
+        putData = MasterData(
+            updates=DeviceParamters(element="Wood", intensity=70),
+            user_touch_allowed=True,
         )
+        put_master_order(get_serial_number, putData)
+
+        with test_client.websocket_connect(
+            f"/device/ws?serial={get_serial_number}",
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        ) as websocket:
+            frame = websocket.receive_json()
+            assert frame["type"] == "control", f"Expected control frame, got {frame}"
+            assert frame["data"]["master_data"] == putData.model_dump()
+
+            interrupt = DeviceParamters(element="Fire", intensity=10)
+            websocket.send_json(
+                {"type": "interrupt", "data": interrupt.model_dump(mode="json")}
+            )
+            frame = websocket.receive_json()
+            assert frame["type"] == "ack", f"Expected ack frame, got {frame}"
+
+            # Orders placed while connected are pushed to the device
+            put_master_order(get_serial_number, putData)
+            frame = websocket.receive_json()
+            assert frame["type"] == "control", f"Expected control frame, got {frame}"
+            assert frame["data"]["master_data"] == putData.model_dump()
+
+            websocket.send_json({"type": "unknown"})
+            frame = websocket.receive_json()
+            assert frame["type"] == "error", f"Expected error frame, got {frame}"
+
+        assert db.get_master_data(get_serial_number, "History") == putData
+
+        remove_master_history(get_serial_number)
+
+    def test_control_channel_push_failure(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+
+        async def wait(*args, **kwargs) -> int:
+            raise RuntimeError("Notification hub failure")
+
+        monkeypatch.setattr(db.notification_hub, "wait", wait)
+        with pytest.raises(WebSocketDisconnect) as disconnect:
+            with test_client.websocket_connect(
+                f"/device/ws?serial={get_serial_number}",
+                headers={"Authorization": f"Bearer {get_device_token}"},
+            ) as websocket:
+                websocket.receive_json()
+        assert disconnect.value.code == status.WS_1011_INTERNAL_ERROR
+
+    def test_control_channel_unauthorized(
+        self, test_client: TestClient, get_serial_number: str
+    ) -> None:
+        with pytest.raises(WebSocketDisconnect):
+            with test_client.websocket_connect(
+                f"/device/ws?serial={get_serial_number}&token=invalid"
+            ) as websocket:
+                websocket.receive_json()
+
+    def test_put_device(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+        make_device_data: Callable[..., DeviceData],
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = make_device_data(get_serial_number, "string")
 
         response = test_client.post(
             "/device/put-device/",
@@ -121,7 +356,114 @@ class TestDevice:
         except ValueError as err:
             pytest.fail(f"failed to remove device history, {err}!")
 
+    def test_put_device_batch(
+        self,
+        test_client: TestClient,
+        get_device_token: str,
+        get_serial_number: str,
+        make_device_data: Callable[..., DeviceData],
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = [
+            make_device_data(
+                get_serial_number, f"2024-01-01T00:{i:02d}:00", temperature=Decimal(i)
+            )
+            for i in range(30)
+        ]
+        items = [data.model_dump(mode="json") for data in putData]
+        items.insert(1, {"Serial_Number": get_serial_number})
+
+        response = test_client.post(
+            "/device/put-device-batch",
+            json=items,
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert response.json()["succeeded"] == 30
+        assert response.json()["failed"] == 1
+        assert [result["index"] for result in response.json()["results"]] == list(
+            range(31)
+        ), "Results not reported per item"
+        assert not response.json()["results"][1]["success"], "Invalid item written"
+
+        try:
+            rcvData = db.get_device_data(get_serial_number)
+        except ValueError:
+            pytest.fail("failed to get device data")
+
+        assert putData == rcvData, "Recevied and placed data do not match"
+
+        try:
+            db._remove_device_history(get_serial_number)
+        except ValueError as err:
+            pytest.fail(f"failed to remove device history, {err}!")
+
+    def test_telemetry_buffer(
+        self,
+        get_serial_number: str,
+        thread_device_db: Callable[[], DeviceDataManager],
+        make_device_data: Callable[..., DeviceData],
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = [
+            make_device_data(
+                get_serial_number, f"2024-01-02T00:{i:02d}:00", temperature=Decimal(i)
+            )
+            for i in range(30)
+        ]
+        pool = MeteredThreadPool(max_workers=2)
+
+        async def buffer_telemetry() -> tuple[list[bool], bool, dict]:
+            buffer = TelemetryBuffer(
+                ThreadPoolDataManager(thread_device_db, pool),
+                maxsize=40,
+                flush_interval=60,
+            )
+            buffer.start()
+            accepted = [await buffer.put(data) for data in putData]
+            # Flushed on size (25 items), the rest on close
+            await buffer.close()
+            return accepted, await buffer.put(putData[0]), buffer.stats()
+
+        try:
+            accepted, accepted_after_close, stats = asyncio.run(buffer_telemetry())
+        finally:
+            pool.shutdown()
+
+        assert all(accepted), "Telemetry rejected before the queue was full"
+        assert not accepted_after_close, "Telemetry accepted after closing"
+        assert stats["written"] == 30 and stats["flushes"] == 2
+        try:
+            assert db.get_device_data(get_serial_number) == putData
+        finally:
+            db._remove_device_history(get_serial_number)
+
+    def test_telemetry_buffer_backpressure(
+        self, get_serial_number: str, make_device_data: Callable[..., DeviceData]
+    ) -> None:
+        data = make_device_data(get_serial_number, "string")
+
+        async def fill_queue() -> list[bool]:
+            # Not started, nothing is flushed
+            buffer = TelemetryBuffer(get_sync_device_db(), maxsize=2, flush_interval=1)
+            return [await buffer.put(data, timeout=0.01) for _ in range(3)]
+
+        assert asyncio.run(fill_queue()) == [True, True, False]
+
+    def test_put_device_batch_too_large(
+        self, test_client: TestClient, get_device_token: str
+    ) -> None:
+        response = test_client.post(
+            "/device/put-device-batch",
+            json=[{}] * 501,
+            headers={"Authorization": f"Bearer {get_device_token}"},
+        )
+        assert (
+            response.status_code == 422
+        ), f"Expected 422 Unprocessable Entity, got {response.json()}"
+
     # def test_remove_device_history(self, get_serial_number: str):
-    #     db: DeviceDataManager = get_device_db()
+    #     db: DeviceDataManager = get_sync_device_db()
     #     print(get_serial_number)
     #     db._remove_device_history(get_serial_number)
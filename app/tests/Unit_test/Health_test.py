@@ -0,0 +1,62 @@
+from ...sleepAPI import real_time
+from ...sleepAPI.real_time import iSuke_Status
+from ..Utils.registration import (
+    register_user_with_scopes,
+    get_test_access_token,
+    delete_manager,
+)
+import pytest
+from fastapi.testclient import TestClient
+import asyncio
+
+
+@pytest.fixture(scope="module")
+def get_device_token(
+    test_client: TestClient, get_username: str, get_password: str, get_root_token: str
+):
+    scope = "Device"
+    device_username = get_username + "-Health"
+    register_user_with_scopes(
+        test_client, device_username, get_password, get_root_token, scope
+    )
+    device_token = get_test_access_token(
+        test_client, device_username, get_password, [scope]
+    )
+    yield device_token
+    delete_manager(test_client, device_username, get_root_token)
+
+
+def test_health_disabled(
+    test_client: TestClient,
+    get_device_token: str,
+    get_serial_number: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(iSuke_Status, "creds_valid", False)
+    response = test_client.post(
+        "/medical/realtimeHrRrData",
+        headers={"Authorization": f"Bearer {get_device_token}"},
+        json=get_serial_number,
+    )
+    assert (
+        response.status_code == 503
+    ), f"Expected 503 Service Unavailable, got {response.json()}"
+
+
+def test_iSuke_revalidation(monkeypatch: pytest.MonkeyPatch) -> None:
+    probe_results = iter([True, False])
+
+    async def check_iSuke_API_async(*args) -> bool:
+        return next(probe_results)
+
+    monkeypatch.setattr(real_time, "check_iSuke_API_async", check_iSuke_API_async)
+    monkeypatch.setattr(real_time, "_iSuke_creds_loaded", True)
+    for name in ("API_URL", "API_KEY", "CUSTOMER_CODE"):
+        monkeypatch.setattr(real_time, name, "", raising=False)
+    monkeypatch.setattr(iSuke_Status, "creds_valid", False)
+    monkeypatch.setattr(iSuke_Status, "last_checked", None)
+
+    assert asyncio.run(real_time.probe_iSuke_API(timeout=1.0))
+    assert iSuke_Status.creds_valid, "Health API not enabled"
+    assert not asyncio.run(real_time.probe_iSuke_API(timeout=1.0))
+    assert not iSuke_Status.creds_valid, "Health API not disabled"
@@ -1,4 +1,6 @@
-from ...database import DeviceDataManager, get_device_db
+from ...database import DeviceDataManager, get_device_db, get_sync_device_db
+from ...database.ThreadPoolManager import MeteredThreadPool, ThreadPoolDataManager
+from ...main import app
 from ...models.Device import MasterData, DeviceParamters, DeviceData
 import pytest
 from fastapi.testclient import TestClient
@@ -10,7 +12,10 @@ from ..Utils.registration import (
     remove_master_order,
     remove_master_history,
 )
+from collections.abc import Callable
 from decimal import Decimal
+import csv
+import io
 
 
 @pytest.fixture(scope="module")
@@ -33,7 +38,7 @@ class TestManager:
     def test_put_master_order(
         self, test_client, get_manager_token, get_serial_number
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
             user_touch_allowed=False,
@@ -55,7 +60,7 @@ class TestManager:
         remove_master_order(get_serial_number)
 
     def test_put_master_history(self, get_serial_number) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
             user_touch_allowed=False,
@@ -80,7 +85,7 @@ class TestManager:
     def test_get_master_state(
         self, test_client, get_manager_token, get_serial_number
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
             user_touch_allowed=False,
@@ -95,6 +100,46 @@ class TestManager:
 
         remove_master_history(get_serial_number)
 
+    def test_get_master_state_not_modified(
+        self, test_client, get_manager_token, get_serial_number
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = MasterData(
+            updates=DeviceParamters(element="Fire", intensity=60),
+            user_touch_allowed=True,
+        )
+        db._put_master_history(get_serial_number, putData)
+        response = test_client.get(
+            f"/manager/get-master-state?serial={get_serial_number}",
+            headers={"Authorization": f"Bearer {get_manager_token}"},
+        )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        etag = response.headers["ETag"]
+
+        response = test_client.get(
+            f"/manager/get-master-state?serial={get_serial_number}",
+            headers={
+                "Authorization": f"Bearer {get_manager_token}",
+                "If-None-Match": etag,
+            },
+        )
+        assert response.status_code == 304, "Expected 304 Not Modified"
+
+        # Changing the state invalidates the ETag
+        putData.updates.intensity = 70
+        db._put_master_history(get_serial_number, putData)
+        response = test_client.get(
+            f"/manager/get-master-state?serial={get_serial_number}",
+            headers={
+                "Authorization": f"Bearer {get_manager_token}",
+                "If-None-Match": etag,
+            },
+        )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert response.headers["ETag"] != etag, "ETag not updated"
+
+        remove_master_history(get_serial_number)
+
     def test_get_device_history_none(
         self, test_client, get_manager_token, get_serial_number
     ) -> None:
@@ -107,22 +152,12 @@ class TestManager:
         ), f"Expected 404 Not Found, got {response.json()}"
 
     def test_get_device_history(
-        self, test_client, get_manager_token, get_serial_number
+        self, test_client, get_manager_token, get_serial_number, make_device_data
     ) -> None:
-        db: DeviceDataManager = get_device_db()
-        putData = DeviceData(
-            Serial_Number=get_serial_number,
-            Local_Time_Str="string",
-            local_ip="string",
-            location="string",
-            region="string",
-            country="string",
-            latitude="string",
-            longitude="string",
-            temperature=Decimal(0),
-            condition="string",
-            wind_speed=Decimal(0),
-            humidity=Decimal(0),
+        db: DeviceDataManager = get_sync_device_db()
+        putData = make_device_data(
+            get_serial_number,
+            "string",
             state=DeviceParamters(element="Wood", intensity=40),
         )
         try:
@@ -144,11 +179,253 @@ class TestManager:
         remove_master_history(get_serial_number)
         db._remove_device_history(get_serial_number)
 
+    def test_get_device_history_pages(
+        self, test_client, get_manager_token, get_serial_number, make_device_data
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = [
+            make_device_data(
+                get_serial_number,
+                f"2024-01-{day:02d}T00:00:00",
+                temperature=Decimal(day),
+                state=DeviceParamters(element="Wood", intensity=40),
+            )
+            for day in range(1, 8)
+        ]
+        db.put_device_data_batch(putData)
+
+        rcvData = []
+        params = {
+            "serial": get_serial_number,
+            "from": "2024-01-02",
+            "to": "2024-01-06T23:59:59",
+            "limit": 2,
+        }
+        headers = {"Authorization": f"Bearer {get_manager_token}"}
+        try:
+            for _ in range(4):
+                response = test_client.get(
+                    "/manager/get-device-history", params=params, headers=headers
+                )
+                assert (
+                    response.status_code == 200
+                ), f"Expected 200 OK, got {response.json()}"
+                rcvData += [DeviceData(**data) for data in response.json()]
+                if "X-Next-Cursor" not in response.headers:
+                    break
+                params["cursor"] = response.headers["X-Next-Cursor"]
+
+            assert rcvData == putData[5:0:-1], "Pages not newest first within range"
+
+            response = test_client.get(
+                "/manager/get-device-history",
+                params={"serial": get_serial_number, "cursor": "invalid"},
+                headers=headers,
+            )
+            assert (
+                response.status_code == 400
+            ), f"Expected 400 Bad Request, got {response.json()}"
+        finally:
+            db._remove_device_history(get_serial_number)
+
+    def test_export_device_history(
+        self, test_client, get_manager_token, get_serial_number, make_device_data
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        putData = [
+            make_device_data(
+                get_serial_number,
+                f"2024-01-{day:02d}T00:00:00",
+                temperature=Decimal(day),
+                condition="string, with a comma",
+                state=DeviceParamters(element="Wood", intensity=40),
+            )
+            for day in range(1, 4)
+        ]
+        db.put_device_data_batch(putData)
+        headers = {"Authorization": f"Bearer {get_manager_token}"}
+
+        try:
+            response = test_client.get(
+                "/manager/device-history/export",
+                params={"serial": get_serial_number},
+                headers=headers,
+            )
+            assert response.status_code == 200, f"Expected 200 OK, got {response.text}"
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            rcvData = [
+                DeviceData.model_validate_json(line)
+                for line in response.text.splitlines()
+            ]
+            assert rcvData == putData, "Exported and placed data do not match"
+
+            response = test_client.get(
+                "/manager/device-history/export",
+                params={
+                    "serial": get_serial_number,
+                    "format": "csv",
+                    "to": "2024-01-02",
+                },
+                headers=headers,
+            )
+            assert response.status_code == 200, f"Expected 200 OK, got {response.text}"
+            rows = list(csv.DictReader(io.StringIO(response.text)))
+            assert [row["Local_Time_Str"] for row in rows] == [
+                "2024-01-01T00:00:00"
+            ], "Range not applied to the export"
+            assert rows[0]["condition"] == "string, with a comma"
+            assert (rows[0]["element"], rows[0]["intensity"]) == ("Wood", "40")
+        finally:
+            db._remove_device_history(get_serial_number)
+
+    def test_export_device_history_RuntimeError(
+        self,
+        test_client,
+        get_manager_token,
+        get_serial_number,
+        thread_device_db: Callable[[], DeviceDataManager],
+    ) -> None:
+        def missing_table_db() -> DeviceDataManager:
+            db = thread_device_db()
+            # Querying a table that does not exist fails on AWS's side
+            db.device_table = db.dyn_resource.Table("Missing_Device_Table")
+            return db
+
+        pool = MeteredThreadPool(max_workers=1)
+        db = ThreadPoolDataManager(missing_table_db, pool)
+        app.dependency_overrides[get_device_db] = lambda: db
+        try:
+            response = test_client.get(
+                "/manager/device-history/export",
+                params={"serial": get_serial_number},
+                headers={"Authorization": f"Bearer {get_manager_token}"},
+            )
+        finally:
+            del app.dependency_overrides[get_device_db]
+            pool.shutdown()
+        # The first page is read before the response starts
+        assert (
+            response.status_code == 500
+        ), f"Expected 500 Internal Server Error, got {response.status_code}"
+
+    def test_device_history_inverted_range(
+        self, test_client, get_manager_token, get_serial_number
+    ) -> None:
+        params = {
+            "serial": get_serial_number,
+            "from": "2024-01-02T00:00:00",
+            "to": "2024-01-01T00:00:00",
+        }
+        for path in [
+            "/manager/get-device-history",
+            "/manager/device-history/export",
+            "/manager/device-history/rollup",
+        ]:
+            response = test_client.get(
+                path,
+                params=params,
+                headers={"Authorization": f"Bearer {get_manager_token}"},
+            )
+            assert (
+                response.status_code == 400
+            ), f"Expected 400 Bad Request from {path}, got {response.status_code}"
+
+    def test_rollup_device_history(
+        self, test_client, get_manager_token, get_serial_number, make_device_data
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        samples = [
+            ("2024-01-01T10:00:00", "Wood", 50, 20),
+            ("2024-01-01T10:30:00", "Fire", 0, 22),
+            ("2024-01-01T11:00:00", "Fire", 100, 24),
+            ("2024-01-02T09:00:00", "Wood", 100, 30),
+        ]
+        putData = [
+            make_device_data(
+                get_serial_number,
+                local_time,
+                temperature=Decimal(temperature),
+                humidity=Decimal(50),
+                state=DeviceParamters(element=element, intensity=intensity),
+            )
+            for local_time, element, intensity, temperature in samples
+        ]
+        db.put_device_data_batch(putData)
+
+        try:
+            response = test_client.get(
+                "/manager/device-history/rollup",
+                params={"serial": get_serial_number, "bucket": "day"},
+                headers={"Authorization": f"Bearer {get_manager_token}"},
+            )
+        finally:
+            db._remove_device_history(get_serial_number)
+
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        rollup = response.json()
+        assert rollup["bucket_start"] == ["2024-01-01T00:00:00", "2024-01-02T00:00:00"]
+        assert rollup["samples"] == [3, 1]
+        assert rollup["temperature"] == {
+            "mean": [22.0, 30.0],
+            "min": [20.0, 30.0],
+            "max": [24.0, 30.0],
+        }
+        # Each item lasts until the next one, at most an hour
+        assert rollup["time_in_element"] == {"Fire": [5400, 0], "Wood": [1800, 0]}
+        assert rollup["intensity_by_element"]["Fire"] == [50.0, None]
+        assert rollup["duty_cycle"] == [5400 / 86400, 0]
+
+    def test_rollup_splits_items_across_buckets(
+        self, test_client, get_manager_token, get_serial_number, make_device_data
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        samples = [
+            ("2024-01-01T00:30:00", "Fire", 50),
+            ("2024-01-01T01:10:00", "Wood", 0),
+            ("2024-01-01T03:10:00", "Wood", 0),
+        ]
+        db.put_device_data_batch(
+            [
+                make_device_data(
+                    get_serial_number,
+                    local_time,
+                    state=DeviceParamters(element=element, intensity=intensity),
+                )
+                for local_time, element, intensity in samples
+            ]
+        )
+
+        try:
+            response = test_client.get(
+                "/manager/device-history/rollup",
+                params={"serial": get_serial_number, "bucket": "hour", "max_gap": 7200},
+                headers={"Authorization": f"Bearer {get_manager_token}"},
+            )
+        finally:
+            db._remove_device_history(get_serial_number)
+
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        rollup = response.json()
+        # Items count in each bucket they span, including ones without samples
+        assert rollup["bucket_start"] == [
+            "2024-01-01T00:00:00",
+            "2024-01-01T01:00:00",
+            "2024-01-01T02:00:00",
+            "2024-01-01T03:00:00",
+        ]
+        assert rollup["samples"] == [1, 1, 0, 1]
+        assert rollup["temperature"]["mean"][2] is None
+        assert rollup["time_in_element"] == {
+            "Fire": [1800, 600, 0, 0],
+            "Wood": [0, 3000, 3600, 600],
+        }
+        assert rollup["duty_cycle"] == [0.5, 600 / 3600, 0, 0]
+
     def test_remove_master_order(
         self,
         get_serial_number,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
             user_touch_allowed=False,
@@ -169,7 +446,7 @@ class TestManager:
         assert rcvData is None, "Failed to remove master order"
 
     def test_remove_master_history(self, get_serial_number) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         putData = MasterData(
             updates=DeviceParamters(element="Wood", intensity=50),
             user_touch_allowed=False,
@@ -191,3 +468,12 @@ class TestManager:
             pytest.fail(f"failed to get master data, {err}")
 
         assert rcvData is None, "Failed to remove master history"
+
+    def test_db_stats(self, test_client, get_manager_token) -> None:
+        response = test_client.get(
+            "/manager/db-stats",
+            headers={"Authorization": f"Bearer {get_manager_token}"},
+        )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert response.json()["thread_pool"]["max_workers"] > 0
+        assert "hits" in response.json()["caches"]["history"]
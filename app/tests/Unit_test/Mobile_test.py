@@ -1,14 +1,28 @@
-from ...database import DeviceDataManager, get_device_db
+from ...database import (
+    DeviceDataManager,
+    ThreadPoolDataManager,
+    get_device_db,
+    get_sync_device_db,
+    sweep,
+)
+from ...database.ThreadPoolManager import MeteredThreadPool
+from ...main import app
 from ...models.Device import (
     ClientData,
     MasterData,
     ScheduleData,
+    ScheduleRecurrence,
     DeviceParamters,
 )
 from ..Utils.fake_serials import reserved_serial
 import pytest
 from fastapi.testclient import TestClient
+import asyncio
+import math
 import urllib
+from contextlib import suppress
+from decimal import Decimal
+from datetime import UTC, datetime, timedelta
 
 
 @pytest.fixture
@@ -53,7 +67,7 @@ class TestMobile:
         v_schedule_data: ScheduleData,
         register_testing_device: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
 
         response = test_client.put(
             f"/mobile/put-schedule?serial_number={get_serial_number}",
@@ -102,7 +116,7 @@ class TestMobile:
         device_data_with_user_touch_not_allowed: MasterData,
         register_testing_device: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         try:
             db._put_master_history(
                 get_serial_number, device_data_with_user_touch_not_allowed
@@ -136,6 +150,63 @@ class TestMobile:
         rcvData = ScheduleData(**response.json()[0])
         assert putData == rcvData, "Failed to get schedules"
 
+        response = test_client.get(
+            f"/mobile/get-schedules?serial_number={get_serial_number}",
+            headers={
+                "Authorization": f"Bearer {get_root_token}",
+                "If-None-Match": response.headers["ETag"],
+            },
+        )
+        assert response.status_code == 304, "Expected 304 Not Modified"
+
+    def test_get_schedules_version(
+        self,
+        test_client: TestClient,
+        get_serial_number: str,
+        get_root_token: str,
+        get_schedule_data: ScheduleData,
+        v_schedule_data: ScheduleData,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        url = f"/mobile/get-schedules?serial_number={get_serial_number}"
+        headers = {"Authorization": f"Bearer {get_root_token}"}
+        operations: list[str] = []
+
+        def record(model, **kwargs) -> None:
+            operations.append(model.name)
+
+        # A single worker, sharing the client the hook is registered on
+        pool = MeteredThreadPool(max_workers=1)
+        app.dependency_overrides[get_device_db] = lambda: ThreadPoolDataManager(
+            lambda: db, pool
+        )
+        events = db.dyn_resource.meta.client.meta.events
+        events.register("before-call.dynamodb", record)
+        try:
+            etag = test_client.get(url, headers=headers).headers["ETag"]
+            operations.clear()
+            response = test_client.get(url, headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 304, "Expected 304 Not Modified"
+            assert operations == ["GetItem"], operations
+
+            # Any write of the schedules bumps their version
+            later = v_schedule_data.model_copy(
+                update={
+                    "start_time": v_schedule_data.end_time + timedelta(hours=1),
+                    "end_time": v_schedule_data.end_time + timedelta(hours=2),
+                }
+            )
+            db.put_schedule(get_serial_number, later)
+            db.remove_schedule(get_serial_number, later.start_time)
+            response = test_client.get(url, headers={**headers, "If-None-Match": etag})
+        finally:
+            events.unregister("before-call.dynamodb", record)
+            del app.dependency_overrides[get_device_db]
+            pool.shutdown()
+        assert response.status_code == 200, "Expected 200 OK, schedules were written"
+        assert response.headers["ETag"] != etag, "ETag not changed by writes"
+        assert [ScheduleData(**item) for item in response.json()] == [get_schedule_data]
+
     def test_update_state_device_not_found(
         self, test_client: TestClient, get_root_token: str
     ) -> None:
@@ -153,6 +224,94 @@ class TestMobile:
         ), f"Expected Bad Request: Device (Serial Number) Not Found, \
             got {response.json()}"
 
+    def test_stream_device_state_device_not_found(
+        self, test_client: TestClient, get_root_token: str
+    ) -> None:
+        invalid_serial_number = reserved_serial()
+
+        response = test_client.get(
+            f"/mobile/stream-device-state?serial_number={invalid_serial_number}",
+            headers={"Authorization": f"Bearer {get_root_token}"},
+        )
+
+        assert (
+            response.status_code == 404
+        ), f"Expected 404 Not Found, got {response.json()}"
+
+    def test_stream_device_state(
+        self,
+        test_client: TestClient,
+        get_serial_number: str,
+        get_root_token: str,
+        device_data_with_user_touch_allowed: MasterData,
+        register_testing_device: str,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        db._put_master_history(get_serial_number, device_data_with_user_touch_allowed)
+        newData = MasterData(
+            updates=DeviceParamters(element="Fire", intensity=25),
+            user_touch_allowed=True,
+        )
+
+        # The test client reads responses to the end, the stream never ends so
+        # the app is called directly (in its event loop)
+        async def read_events() -> list[str]:
+            messages = asyncio.Queue()
+
+            async def receive() -> dict:
+                await asyncio.Event().wait()  # Never disconnects
+
+            scope = {
+                "type": "http",
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": "/mobile/stream-device-state",
+                "raw_path": b"/mobile/stream-device-state",
+                "root_path": "",
+                "query_string": f"serial_number={get_serial_number}".encode(),
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"authorization", f"Bearer {get_root_token}".encode()),
+                ],
+                "client": ("testclient", 50000),
+                "server": ("testserver", 80),
+            }
+            stream = asyncio.create_task(app(scope, receive, messages.put))
+            events = []
+            try:
+                while len(events) < 2:
+                    message = await asyncio.wait_for(messages.get(), timeout=10)
+                    if message["type"] == "http.response.start":
+                        assert message["status"] == 200, "Expected 200 OK"
+                    elif message.get("body", b"").startswith(b"event: "):
+                        events.append(message["body"].decode())
+                        if len(events) == 1:
+                            # Published by the write, wakes up the stream
+                            await asyncio.to_thread(
+                                db._put_master_history, get_serial_number, newData
+                            )
+            finally:
+                stream.cancel()
+                with suppress(asyncio.CancelledError):
+                    await stream
+            return events
+
+        try:
+            events = test_client.portal.call(read_events)
+        finally:
+            db._remove_master_history(get_serial_number)
+
+        assert [event.split("\n")[0] for event in events] == ["event: state"] * 2
+        states = [
+            ClientData.model_validate_json(event.split("\n")[1].removeprefix("data: "))
+            for event in events
+        ]
+        assert states == [
+            ClientData(updates=device_data_with_user_touch_allowed.updates),
+            ClientData(updates=newData.updates),
+        ], "State change not streamed"
+
     def test_update_state(
         self,
         test_client: TestClient,
@@ -161,7 +320,7 @@ class TestMobile:
         device_data_with_user_touch_allowed: MasterData,
         register_testing_device: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
         try:
             db._put_master_history(
                 get_serial_number, device_data_with_user_touch_allowed
@@ -202,7 +361,7 @@ class TestMobile:
         device_data_with_user_touch_allowed: MasterData,
         register_testing_device: str,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
 
         try:
             db._put_master_history(
@@ -235,7 +394,7 @@ class TestMobile:
         get_root_token: str,
         v_schedule_data: ScheduleData,
     ) -> None:
-        db: DeviceDataManager = get_device_db()
+        db: DeviceDataManager = get_sync_device_db()
 
         try:
             db.put_schedule(get_serial_number, v_schedule_data)
@@ -250,3 +409,298 @@ class TestMobile:
 
         assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
         assert db.get_schedules(get_serial_number) == [], "Failed to delete schedule"
+
+    def test_schedule_control_follows_schedules(
+        self,
+        test_client: TestClient,
+        get_serial_number: str,
+        register_testing_device: str,
+        v_schedule_data: ScheduleData,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        now = datetime.now(UTC)
+        # Ended schedule (written without its times in seconds nor TTL)
+        assert db.schedule_table is not None
+        db.schedule_table.put_item(
+            Item={
+                "Serial_Number": get_serial_number,
+                "start_time": (now - timedelta(hours=2)).isoformat(),
+                "end_time": (now - timedelta(hours=1)).isoformat(),
+                "scheduled_paramters": {"element": "Wood", "intensity": 50},
+            }
+        )
+        later = ScheduleData(
+            start_time=v_schedule_data.start_time + timedelta(hours=1),
+            end_time=v_schedule_data.end_time + timedelta(hours=1),
+            scheduled_paramters=v_schedule_data.scheduled_paramters,
+        )
+
+        try:
+            db.put_schedule(get_serial_number, later)
+            latest = db.put_schedule(get_serial_number, v_schedule_data)
+        except (RuntimeError, ValueError) as err:
+            pytest.fail(f"Failed to put schedule, {err}")
+
+        assert latest is not None and ScheduleData(**latest) == v_schedule_data
+        assert db.get_schedule_control(get_serial_number) == v_schedule_data
+        assert db.get_schedules(get_serial_number) == [v_schedule_data, later]
+        # Skipped by reads, but only removed by the TTL (or a sweep)
+        items = db._query_schedules(get_serial_number)
+        assert len(items) == 3
+        assert [item.get("expires_at") for item in items[1:]] == [
+            math.ceil(schedule.end_time.timestamp())
+            for schedule in (v_schedule_data, later)
+        ]
+        assert db.sweep_expired_schedules() >= 1
+        assert len(db._query_schedules(get_serial_number)) == 2
+        # Run as a scheduled job, nothing left to remove
+        assert sweep.main() == 0
+
+        db.remove_schedule(get_serial_number, v_schedule_data.start_time)
+        assert db.get_schedule_control(get_serial_number) == later
+        db.remove_schedule(get_serial_number, later.start_time)
+        with pytest.raises(ValueError):
+            db.get_schedule_control(get_serial_number)
+
+    def test_schedule_overlap_candidates(
+        self,
+        get_serial_number: str,
+        register_testing_device: str,
+        v_schedule_data: ScheduleData,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        base = v_schedule_data.start_time
+
+        def schedule(start: int, end: int) -> ScheduleData:
+            return ScheduleData(
+                start_time=base + timedelta(minutes=start),
+                end_time=base + timedelta(minutes=end),
+                scheduled_paramters=v_schedule_data.scheduled_paramters,
+            )
+
+        first, second = schedule(0, 20), schedule(40, 60)
+        db.put_schedule(get_serial_number, first)
+        # Stored before the epoch attributes existed
+        assert db.schedule_table is not None
+        legacy = db._schedule_entry(get_serial_number, second)
+        del legacy["start_epoch"], legacy["end_epoch"]
+        db.schedule_table.put_item(Item=legacy)
+        stored = db.schedule_table.get_item(
+            Key={
+                "Serial_Number": get_serial_number,
+                "start_time": db._schedule_entry(get_serial_number, first)[
+                    "start_time"
+                ],
+            }
+        )["Item"]
+        assert stored["end_epoch"] == Decimal(str(first.end_time.timestamp()))
+
+        try:
+            for start, end in ((10, 30), (-10, 0), (30, 45), (50, 90), (-30, 200)):
+                with pytest.raises(ValueError):
+                    db.put_schedule(get_serial_number, schedule(start, end))
+            gap = schedule(25, 35)
+            db.put_schedule(get_serial_number, gap)
+            assert db.get_schedules(get_serial_number) == [first, gap, second]
+            assert db.get_schedule_control(get_serial_number) == first
+        finally:
+            for start in (0, 25, 40):
+                with suppress(ValueError):
+                    db.remove_schedule(
+                        get_serial_number, base + timedelta(minutes=start)
+                    )
+
+    def test_put_schedule_reads_once(
+        self,
+        get_serial_number: str,
+        register_testing_device: str,
+        v_schedule_data: ScheduleData,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        operations: list[str] = []
+
+        def record(model, **kwargs) -> None:
+            operations.append(model.name)
+
+        events = db.dyn_resource.meta.client.meta.events
+        events.register("before-call.dynamodb", record)
+        try:
+            db.put_schedule(get_serial_number, v_schedule_data)
+        finally:
+            events.unregister("before-call.dynamodb", record)
+            db.remove_schedule(get_serial_number, v_schedule_data.start_time)
+
+        # One query of the device's schedules, one of its recurring schedules
+        assert operations == ["Query", "Query", "TransactWriteItems"], operations
+
+    def test_schedule_overlaps_past_ended_schedules(
+        self,
+        get_serial_number: str,
+        register_testing_device: str,
+        v_schedule_data: ScheduleData,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        now = datetime.now(UTC)
+
+        def schedule(start: timedelta, end: timedelta) -> ScheduleData:
+            return v_schedule_data.model_copy(
+                update={"start_time": now + start, "end_time": now + end}
+            )
+
+        # Ended, but kept until its TTL removes it
+        ended = schedule(-timedelta(hours=20), -timedelta(hours=19))
+        assert db.schedule_table is not None
+        db.schedule_table.put_item(Item=db._schedule_entry(get_serial_number, ended))
+        # Started before the ended schedule, and still running
+        running = schedule(-timedelta(days=2), timedelta(days=3))
+
+        try:
+            db.put_schedule(get_serial_number, running)
+            with pytest.raises(ValueError):
+                db.put_schedule(
+                    get_serial_number, schedule(timedelta(hours=1), timedelta(hours=2))
+                )
+            assert db.get_schedule_control(get_serial_number) == running
+            assert db.get_schedules(get_serial_number) == [running]
+        finally:
+            with suppress(ValueError):
+                db.remove_schedule(get_serial_number, running.start_time)
+            db.schedule_table.delete_item(
+                Key={
+                    "Serial_Number": get_serial_number,
+                    "start_time": db._schedule_entry(get_serial_number, ended)[
+                        "start_time"
+                    ],
+                }
+            )
+
+    def test_recurring_schedule(
+        self,
+        test_client: TestClient,
+        get_serial_number: str,
+        get_root_token: str,
+        v_schedule_data: ScheduleData,
+        register_testing_device: str,
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        nightly = v_schedule_data.model_copy(
+            update={
+                "recurrence": ScheduleRecurrence(
+                    frequency="daily", count=30, timezone="Asia/Hong_Kong"
+                )
+            }
+        )
+        headers = {"Authorization": f"Bearer {get_root_token}"}
+
+        response = test_client.put(
+            f"/mobile/put-schedule?serial_number={get_serial_number}",
+            headers=headers,
+            json=nightly.model_dump(),
+        )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        try:
+            # Stored as a single item, spanning all occurrences
+            assert db.schedule_table is not None
+            items = db._query_schedules(get_serial_number)
+            assert len(items) == 1
+            assert items[0]["end_epoch"] == db._epoch(nightly.occurrence(29)[1])
+
+            # Conflicts with a one-off schedule on any night of the series
+            start, end = nightly.occurrence(10)
+            response = test_client.put(
+                f"/mobile/put-schedule?serial_number={get_serial_number}",
+                headers=headers,
+                json=v_schedule_data.model_copy(
+                    update={"start_time": start, "end_time": end}
+                ).model_dump(),
+            )
+            assert response.status_code == 409, f"Expected 409, got {response.json()}"
+            # As does a weekly one, on one of its nights
+            start, end = nightly.occurrence(5)
+            response = test_client.put(
+                f"/mobile/put-schedule?serial_number={get_serial_number}",
+                headers=headers,
+                json=v_schedule_data.model_copy(
+                    update={
+                        "start_time": start,
+                        "end_time": end,
+                        "recurrence": ScheduleRecurrence(frequency="weekly", count=2),
+                    }
+                ).model_dump(),
+            )
+            assert response.status_code == 409, f"Expected 409, got {response.json()}"
+
+            # Other schedules can take place between two nights
+            daytime = v_schedule_data.model_copy(
+                update={
+                    "start_time": end + timedelta(hours=2),
+                    "end_time": end + timedelta(hours=3),
+                }
+            )
+            weekly = daytime.model_copy(
+                update={
+                    "start_time": daytime.start_time + timedelta(days=1),
+                    "end_time": daytime.end_time + timedelta(days=1),
+                    "recurrence": ScheduleRecurrence(frequency="weekly", count=4),
+                }
+            )
+            for schedule in (daytime, weekly):
+                response = test_client.put(
+                    f"/mobile/put-schedule?serial_number={get_serial_number}",
+                    headers=headers,
+                    json=schedule.model_dump(),
+                )
+                assert (
+                    response.status_code == 200
+                ), f"Expected 200 OK, got {response.json()}"
+
+            response = test_client.get(
+                f"/mobile/get-schedules?serial_number={get_serial_number}",
+                headers=headers,
+            )
+            assert response.status_code == 200
+            assert [ScheduleData(**item) for item in response.json()] == [
+                nightly,
+                daytime,
+                weekly,
+            ]
+            assert db.get_schedule_control(get_serial_number) == v_schedule_data
+        finally:
+            for start in (end + timedelta(hours=2), end + timedelta(days=1, hours=2)):
+                with suppress(ValueError):
+                    db.remove_schedule(get_serial_number, start)
+            # Any occurrence deletes the whole series
+            response = test_client.delete(
+                f"/mobile/delete-schedule?serial_number={get_serial_number}&start_time="
+                + urllib.parse.quote(f"{nightly.occurrence(3)[0]}"),
+                headers=headers,
+            )
+        assert response.status_code == 200, f"Expected 200 OK, got {response.json()}"
+        assert db.get_schedules(get_serial_number) == []
+
+    def test_recurring_schedule_expansion(
+        self, get_serial_number: str, register_testing_device: str
+    ) -> None:
+        db: DeviceDataManager = get_sync_device_db()
+        now = datetime.now(UTC)
+        # Started two nights ago, the third night is running
+        nightly = ScheduleData(
+            start_time=now - timedelta(days=2, minutes=10),
+            end_time=now - timedelta(days=2) + timedelta(minutes=10),
+            scheduled_paramters=DeviceParamters(element="Wood", intensity=50),
+            recurrence=ScheduleRecurrence(frequency="daily", count=5),
+        )
+        assert db.schedule_table is not None
+        db.schedule_table.put_item(Item=db._schedule_entry(get_serial_number, nightly))
+
+        try:
+            running = ScheduleData(**db._refresh_schedules(get_serial_number))
+            assert (running.start_time, running.end_time) == nightly.occurrence(2)
+            assert running.recurrence is None
+
+            [schedule] = db.get_schedules(get_serial_number)
+            assert (schedule.start_time, schedule.end_time) == nightly.occurrence(2)
+            assert schedule.recurrence is not None
+            assert schedule.recurrence.count == 3
+        finally:
+            db.remove_schedule(get_serial_number, nightly.start_time)
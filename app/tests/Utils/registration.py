@@ -1,6 +1,6 @@
 from ...models.Device import MasterData
 from fastapi.testclient import TestClient
-from ...database import DeviceDataManager, get_device_db
+from ...database import DeviceDataManager, get_sync_device_db
 from ...internal.Authentication import validate_scopes
 
 
@@ -74,7 +74,7 @@ def delete_manager(client: TestClient, username: str, token: str) -> None:
 
 
 def put_master_order(
-    serial_number: str, data: MasterData, db: DeviceDataManager = get_device_db()
+    serial_number: str, data: MasterData, db: DeviceDataManager = get_sync_device_db()
 ):
     try:
         db.put_master_order(serial_number, data)
@@ -83,7 +83,9 @@ def put_master_order(
         raise AssertionError("Failed to put master order") from err
 
 
-def remove_master_order(serial_number: str, db: DeviceDataManager = get_device_db()):
+def remove_master_order(
+    serial_number: str, db: DeviceDataManager = get_sync_device_db()
+):
     try:
         db._remove_master_order(serial_number)
     except (ValueError, RuntimeError) as err:
@@ -91,7 +93,9 @@ def remove_master_order(serial_number: str, db: DeviceDataManager = get_device_d
         raise AssertionError("Failed to remove master order") from err
 
 
-def remove_master_history(serial_number: str, db: DeviceDataManager = get_device_db()):
+def remove_master_history(
+    serial_number: str, db: DeviceDataManager = get_sync_device_db()
+):
     try:
         db._remove_master_history(serial_number)
     except (ValueError, RuntimeError) as err:
@@ -5,7 +5,10 @@ from ..Utils.registration import (
     remove_master_history,
 )
 from ...database import DeviceDataManager, get_device_db
+from ...database.ThreadPoolManager import MeteredThreadPool, ThreadPoolDataManager
+from ...main import app
 from ...models.Device import MasterData, DeviceParamters
+from collections.abc import Callable
 import pytest
 
 
@@ -183,19 +186,33 @@ class TestDeviceRoutersValidation:
         remove_master_order(get_serial_number)
         remove_master_history(get_serial_number)
 
-    def test_fetch_control_RuntimeError(self, test_client, get_root_token):
+    def test_fetch_control_RuntimeError(
+        self,
+        test_client,
+        get_root_token,
+        thread_device_db: Callable[[], DeviceDataManager],
+    ):
         """
         Test case for fetch control when RuntimeError occurs:
         Master Tables are not loaded
         """
-        db: DeviceDataManager = get_device_db()
-        temp = db.master_history_table
-        db.master_history_table = None
-        response = test_client.post(
-            "/device/fetch-control?serial=HKSW001&refresh=false",
-            headers={"Authorization": f"Bearer {get_root_token}"},
-        )
-        db.master_history_table = temp
+
+        def unbound_db() -> DeviceDataManager:
+            db = thread_device_db()
+            db.master_history_table = None
+            return db
+
+        pool = MeteredThreadPool(max_workers=1)
+        db = ThreadPoolDataManager(unbound_db, pool)
+        app.dependency_overrides[get_device_db] = lambda: db
+        try:
+            response = test_client.post(
+                "/device/fetch-control?serial=HKSW001&refresh=false",
+                headers={"Authorization": f"Bearer {get_root_token}"},
+            )
+        finally:
+            del app.dependency_overrides[get_device_db]
+            pool.shutdown()
         assert (
             response.status_code == 500
         ), f"Expected 500 Internal Server Error, got {response.json()}"
@@ -3,9 +3,13 @@ from fastapi.testclient import TestClient
 from ..main import app
 from ..internal.Authentication import register_user_with_unhashed_password
 from ..database import get_user_db
-from ..database import DeviceDataManager, get_device_db
-from ..models.Device import ScheduleData, DeviceParamters
+from ..database import DeviceDataManager, get_sync_device_db
+from ..database.DynamoDBSession import DynamoDBSession
+from ..internal.credentials import AWS_credentials
+from ..models.Device import DeviceData, ScheduleData, DeviceParamters
+from collections.abc import Callable
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
 from .Utils.registration import (
     read_serial_number,
@@ -16,12 +20,66 @@ from .Utils.registration import (
 
 @pytest.fixture(scope="session")
 def device_db():
-    return get_device_db()
+    return get_sync_device_db()
+
+
+@pytest.fixture(scope="session")
+def thread_device_db() -> Callable[[], DeviceDataManager]:
+    """
+    Factory of DeviceDataManagers bound to the calling thread's resource, sharing
+    the tables and notification hub of the sync manager (see ThreadPoolDataManager).
+    """
+    sync_db = get_sync_device_db()
+    session = DynamoDBSession(*AWS_credentials())
+    tables = (
+        sync_db.device_table,
+        sync_db.master_order_table,
+        sync_db.master_history_table,
+        sync_db.schedule_table,
+        sync_db.schedule_control_table,
+        sync_db.serial_table,
+    )
+
+    def factory() -> DeviceDataManager:
+        db = DeviceDataManager(
+            session.resource(), notification_hub=sync_db.notification_hub
+        )
+        db.load_tables(*(table.name for table in tables), describe=False)
+        return db
+
+    return factory
 
 
 @pytest.fixture(scope="session")
 def test_client():
-    return TestClient(app)
+    # Entering the client runs the app's lifespan (opening the routers' managers)
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def make_device_data():
+    # Builds a device's data for the given local time, with placeholder fields
+    # unless overridden
+    def make(serial: str, time: str, **overrides) -> DeviceData:
+        fields = {
+            "local_ip": "string",
+            "location": "string",
+            "region": "string",
+            "country": "string",
+            "latitude": "string",
+            "longitude": "string",
+            "temperature": Decimal(0),
+            "condition": "string",
+            "wind_speed": Decimal(0),
+            "humidity": Decimal(0),
+            "state": DeviceParamters(element="Fire", intensity=40),
+        }
+        return DeviceData(
+            Serial_Number=serial, Local_Time_Str=time, **(fields | overrides)
+        )
+
+    return make
 
 
 @pytest.fixture(scope="session")
@@ -60,7 +118,10 @@ def get_root_token(test_client: TestClient, get_username: str, get_password: str
         "scopes": ["Admin"],
     }
     # TODO: Handle Exceptions
-    register_user_with_unhashed_password(user_data, get_user_db())
+    # Run in the app's event loop, the routers' managers are awaited
+    test_client.portal.call(
+        register_user_with_unhashed_password, user_data, get_user_db()
+    )
     token = get_test_access_token(test_client, get_username, get_password)
     yield token
     delete_manager(test_client, get_username, token)
@@ -102,7 +163,7 @@ def get_schedule_data(
     v_schedule_data: ScheduleData,
     register_testing_device: str,
 ):
-    db: DeviceDataManager = get_device_db()
+    db: DeviceDataManager = get_sync_device_db()
     try:
         print("Putting Schedule")
         db.put_schedule(get_serial_number, v_schedule_data)